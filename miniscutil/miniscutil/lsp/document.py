@@ -15,6 +15,7 @@ try:
 except:
     from typing_extensions import TypeAlias, TypeVar
 from miniscutil.misc import set_ctx
+from miniscutil.ofdict import ofdict_dataclass
 import logging
 
 logger = logging.getLogger(__name__)
@@ -61,9 +62,26 @@ def cumsum(iterable):
 
 @dataclass
 class Position:
+    __slots__ = ("line", "character")
     line: int
     character: int
 
+    @classmethod
+    def get(cls, line: int, character: int) -> "Position":
+        """Like ``Position(line, character)`` but shares instances for frequently used positions.
+
+        Positions must not be mutated.
+        """
+        if cls is not Position:
+            return cls(line, character)
+        return _shared_position(line, character)
+
+    @classmethod
+    def __ofdict__(cls, d) -> "Position":
+        if isinstance(d, dict) and "line" in d and "character" in d:
+            return cls.get(d["line"], d["character"])
+        return ofdict_dataclass(cls, d)
+
     @classmethod
     def of_offset(cls, offset: int) -> "Position":
         return document_context.get().offset_to_position(offset)
@@ -102,14 +120,20 @@ class Position:
         return hash((self.line, self.character))
 
 
+@functools.lru_cache(maxsize=4096)
+def _shared_position(line: int, character: int) -> Position:
+    return Position(line, character)
+
+
 @dataclass
 class Range:
+    __slots__ = ("start", "end")
     start: Position
     end: Position
 
     @classmethod
     def mk(cls, l0: int, c0: int, l1: int, c1: int):
-        return cls(Position(l0, c0), Position(l1, c1))
+        return cls(Position.get(l0, c0), Position.get(l1, c1))
 
     @classmethod
     def of_pos(cls, pos: Position, length: int = 0):
@@ -294,7 +318,7 @@ class DocumentContext:
 
         assert char % word_length == 0
         char = char // 2
-        return Position(line=line_idx, character=char)
+        return Position.get(line_idx, char)
 
     def add_position(self, position: Position, delta_offset: int) -> Position:
         return self.offset_to_position(self.position_to_offset(position) + delta_offset)
@@ -308,7 +332,11 @@ class DocumentContext:
     # [todo] enter, exit does setdoc
 
 
+@functools.lru_cache(maxsize=1024)
 def path_of_uri(uri: DocumentUri):
+    if uri.startswith("file:///") and not any(c in uri for c in "?#;"):
+        # same result as the urlparse route below for plain file uris.
+        return Path(uri[7:])
     x = urlparse(uri)
     assert x.netloc == ""
     assert x.scheme == "file"
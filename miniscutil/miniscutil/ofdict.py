@@ -3,7 +3,7 @@ from contextlib import contextmanager
 from dataclasses import fields, is_dataclass
 from datetime import datetime
 from enum import Enum
-from functools import singledispatch
+from functools import lru_cache, singledispatch
 import inspect
 import json
 from contextvars import ContextVar
@@ -46,27 +46,34 @@ def is_json_key(key: Any) -> TypeGuard[JsonKey]:
     return isinstance(key, (str, int, float, bool, type(None)))
 
 
+@lru_cache(maxsize=None)
+def _dataclass_schema(A: type) -> tuple[tuple[str, Any, bool], ...]:
+    """The (name, type, is_optional) of each field of dataclass ``A``, computed once per class."""
+    return tuple(
+        (f.name, f.type, f.type is not None and is_optional(f.type)) for f in fields(A)
+    )
+
+
 def ofdict_dataclass(A: Type[T], a: JsonLike) -> T:
     assert is_dataclass(A)
     d2 = {}
-    for f in fields(A):
+    for k, t, optional in _dataclass_schema(A):
         if not isinstance(a, dict):
             raise OfDictError(
                 f"Error while decoding dataclass {A}, expected a dict but got {a} : {type(a)}"
             )
-        k = f.name
         if k not in a:
-            if f.type is not None and is_optional(f.type):
+            if optional:
                 v = None
             else:
                 raise OfDictError(
-                    f"Missing {f.name} on input dict. Decoding {a} to type {A}."
+                    f"Missing {k} on input dict. Decoding {a} to type {A}."
                 )
         else:
             v = a[k]
-        if f.type is not None:
+        if t is not None:
             with dpath(k):
-                d2[k] = ofdict(f.type, v)
+                d2[k] = ofdict(t, v)
         else:
             d2[k] = v
     return A(**d2)  # type: ignore
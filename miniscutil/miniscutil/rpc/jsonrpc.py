@@ -21,6 +21,11 @@ import warnings
 
 from miniscutil.ofdict import MyJsonEncoder, ofdict, todict, todict_dataclass
 import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from .transport import (
     Transport,
     TransportClosedError,
@@ -79,6 +84,41 @@ class ErrorCode(Enum):
 encoder = MyJsonEncoder()
 
 
+def _orjson_default(o):
+    j = todict(o)
+    if j is NotImplemented:
+        raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+    return j
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode a message, using orjson when it is installed.
+
+    Dataclasses and datetimes are passed through to `todict` so that the output
+    matches `MyJsonEncoder`, rather than orjson's own encoding of them.
+    """
+    if orjson is None:
+        return encoder.encode(obj).encode()
+    try:
+        return orjson.dumps(
+            obj,
+            default=_orjson_default,
+            option=orjson.OPT_PASSTHROUGH_DATACLASS
+            | orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_NON_STR_KEYS,
+        )
+    except orjson.JSONEncodeError:
+        # orjson has a fixed nesting limit that deep renderings can hit.
+        return encoder.encode(obj).encode()
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    if orjson is None:
+        return json.loads(data)
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError.
+    return orjson.loads(data)
+
+
 @dataclass
 class Request:
     method: str
@@ -90,7 +130,7 @@ class Request:
         return self.id is None
 
     def to_bytes(self):
-        return encoder.encode(self).encode()
+        return dumps(self)
 
     def __str__(self):
         if self.id is None:
@@ -152,7 +192,7 @@ class Response:
         return d
 
     def to_bytes(self):
-        return encoder.encode(self).encode()
+        return dumps(self)
 
 
 class Dispatcher:
@@ -405,7 +445,7 @@ class RpcServer:
             while True:
                 try:
                     data = await self.transport.recv()
-                    messages = json.loads(data)
+                    messages = loads(data)
                     # res can be a batch
                     if isinstance(messages, dict):
                         messages = [messages]
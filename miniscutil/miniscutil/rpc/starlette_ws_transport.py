@@ -22,7 +22,8 @@ class StarletteWebsocketTransport(Transport):
                     raise TransportClosedError(reason)
             elif t == "websocket.receive":
                 if "text" in message:
-                    return message["text"].encode("utf-8")
+                    # jsonrpc.loads takes str too, no need to re-encode.
+                    return message["text"]
                 elif "bytes" in message:
                     return message["bytes"]
                 else:
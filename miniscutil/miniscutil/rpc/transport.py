@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Awaitable, Protocol
+from typing import Awaitable, Protocol, Union
 
 """
 Abstract definition of Transport for RPC.
@@ -36,9 +36,12 @@ class Transport(ABC):
     """Abstract datagram transport. Data can be sent and recieved in finite-length bytestring messages."""
 
     @abstractmethod
-    def recv(self) -> Awaitable[bytes]:
+    def recv(self) -> Awaitable[Union[bytes, str]]:
         """Wait to recieve the a message.
 
+        Text transports may return the message as a `str`; `jsonrpc.loads` accepts
+        either.
+
         Raises:
           TransportClosedOK: if the transport is closed properly.
           TransportClosedError: if the transport is closed with an error.
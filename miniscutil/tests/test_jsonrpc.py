@@ -0,0 +1,37 @@
+from dataclasses import dataclass, field
+from typing import List
+
+from miniscutil.rpc import Request, Response, loads
+
+
+@dataclass
+class Node:
+    tag: str
+    children: List["Node"] = field(default_factory=list)
+
+
+def deep_node(depth: int) -> Node:
+    root = node = Node("div")
+    for _ in range(depth):
+        child = Node("div")
+        node.children.append(child)
+        node = child
+    return root
+
+
+def depth_of(d: dict) -> int:
+    n = 0
+    while d["children"]:
+        d = d["children"][0]
+        n += 1
+    return n
+
+
+def test_deep_roundtrip():
+    for depth in [10, 100, 130, 300]:
+        node = deep_node(depth)
+        req = loads(Request(method="patch", id=1, params=node).to_bytes())
+        assert req["method"] == "patch"
+        assert depth_of(req["params"]) == depth
+        resp = loads(Response(id=1, result=node).to_bytes())
+        assert depth_of(resp["result"]) == depth
@@ -1,11 +1,9 @@
 import logging
-from typing import Any, Optional
+from typing import Optional
 from urllib.parse import urlparse
 from fastapi import APIRouter, Depends, Request, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse
 from miniscutil.misc import append_url_params, human_size
-import dominate
-import dominate.tags as t
 
 from blobular.registry import BlobClaim
 
@@ -27,6 +25,19 @@ Things to make:
 
 logger = logging.getLogger(__name__)
 
+# fonts = [ "iosevka", "iosevka-aile", "iosevka-curly-slab", "iosevka-curly", "iosevka-etoile", "iosevka-slab"]
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+  <head>
+    <title>Blobular</title>
+    <link href="https://unpkg.com/tachyons@4.12.0/css/tachyons.min.css" rel="stylesheet">
+    <link href="https://cdn.jsdelivr.net/gh/aymanbagabas/iosevka-fonts@v11.1.1/dist/iosevka-slab/iosevka-slab.min.css" rel="stylesheet">
+    <style>body, code {{ font-family: Iosevka Slab Web, monospace;}}th {{ text-align: left; }}th, td {{ padding-right: 1rem; }}</style>
+  </head>
+  <body class="ph6 pt2">{body}</body>
+</html>"""
+""" Page shell for the html endpoints, `body` is the static html of the rendering. """
+
 
 def get_sign_in_url():
     cfg = Settings.current()
@@ -147,24 +158,5 @@ async def read_root(user: User = Depends(try_get_user), db: Db = Depends(databas
     # just do a full loop to get the render.
     r = render_static(root)
 
-    doc: Any = dominate.document(title="Blobular")
-    with doc.head:
-        t.link(
-            rel="stylesheet",
-            href="https://unpkg.com/tachyons@4.12.0/css/tachyons.min.css",
-        )
-        # fonts = [ "iosevka", "iosevka-aile", "iosevka-curly-slab", "iosevka-curly", "iosevka-etoile", "iosevka-slab"]
-        t.link(
-            rel="stylesheet",
-            href=f"https://cdn.jsdelivr.net/gh/aymanbagabas/iosevka-fonts@v11.1.1/dist/iosevka-slab/iosevka-slab.min.css",
-        )
-        t.style(
-            "body, code { font-family: Iosevka Slab Web, monospace;}",
-            "th { text-align: left; }",
-            "th, td { padding-right: 1rem; }",
-        )
-
-    doc.add(r.static())
-    doc.body["class"] = "ph6 pt2"
-    content = doc.render()
+    content = PAGE_TEMPLATE.format(body=r.to_static_html())
     return HTMLResponse(content=content)
@@ -2,6 +2,7 @@ from uxu.listdiff import diff, Reorder
 from hypothesis import given, assume
 import hypothesis.strategies as hs
 from itertools import product
+from functools import lru_cache
 
 
 def texts():
@@ -17,15 +18,31 @@ def expanders(draw):
     return l1, l2, expander
 
 
+@lru_cache(maxsize=None)
+def _cached_diff(l1: tuple, l2: tuple) -> Reorder:
+    return diff(list(l1), list(l2))
+
+
+def cached_diff(l1, l2) -> Reorder:
+    """Memoised `diff` for the explicit product tests, which revisit the same pairs many times."""
+    return _cached_diff(tuple(l1), tuple(l2))
+
+
+def teardown_module():
+    _cached_diff.cache_clear()
+
+
 def flatten(l):
-    def core(x):
-        if isinstance(x, list):
-            for y in x:
-                yield from core(y)
+    out, stack = [], [iter(l)]
+    while stack:
+        for x in stack[-1]:
+            if isinstance(x, list):
+                stack.append(iter(x))
+                break
+            out.append(x)
         else:
-            yield x
-
-    return list(core(l))
+            stack.pop()
+    return out
 
 
 def expander_prop(xs):
@@ -56,27 +73,27 @@ def expander_prop(xs):
     assert all(x == y for x, y in zip(l2ex, l2e))
 
 
-def validate_prop(l1, l2):
-    r = diff(l1, l2)
+def validate_prop(l1, l2, differ=diff):
+    r = differ(l1, l2)
     r.validate()
 
 
-def recover_prop(l1, l2):
-    r = diff(l1, l2)
+def recover_prop(l1, l2, differ=diff):
+    r = differ(l1, l2)
     l3 = r.apply(l1)
     assert len(l2) == len(l3)
     assert all(x is y for x, y in zip(l2, l3))
 
 
-def invert_prop(l1, l2):
-    r = diff(l1, l2).compose(diff(l2, l1)).apply(l1)
+def invert_prop(l1, l2, differ=diff):
+    r = differ(l1, l2).compose(differ(l2, l1)).apply(l1)
     assert len(l1) == len(r)
     assert all(x is y for x, y in zip(l1, r))
 
 
-def compose_prop(l1, l2, l3):
-    δ12 = diff(l1, l2)
-    δ23 = diff(l2, l3)
+def compose_prop(l1, l2, l3, differ=diff):
+    δ12 = differ(l1, l2)
+    δ23 = differ(l2, l3)
 
     δ13x = δ12.compose(δ23)
     δ13x.validate()
@@ -86,9 +103,9 @@ def compose_prop(l1, l2, l3):
     assert all(x is y for x, y in zip(l3, l3x))
 
 
-def concat_prop(l1, l2, l3, l4):
-    δ1_2 = diff(l1, l2)
-    δ3_4 = diff(l3, l4)
+def concat_prop(l1, l2, l3, l4, differ=diff):
+    δ1_2 = differ(l1, l2)
+    δ3_4 = differ(l3, l4)
     δ13_24 = δ1_2.concat(δ3_4)
     δ13_24.validate()
     r1 = δ13_24.apply(l1 + l3)
@@ -103,22 +120,22 @@ examples = [list(x) for x in examples]
 
 def test_recover_explicit():
     for x, y in product(examples, examples):
-        recover_prop(x, y)
+        recover_prop(x, y, differ=cached_diff)
 
 
 def test_validate_explicit():
     for x, y in product(examples, examples):
-        validate_prop(x, y)
+        validate_prop(x, y, differ=cached_diff)
 
 
 def test_prop_compose():
     for x, y, z in product(examples, examples, examples):
-        compose_prop(x, y, z)
+        compose_prop(x, y, z, differ=cached_diff)
 
 
 def test_prop_concat():
     for x, y, z, w in product(examples, examples, examples, examples):
-        concat_prop(x, y, z, w)
+        concat_prop(x, y, z, w, differ=cached_diff)
 
 
 def test_expander1():
@@ -146,6 +163,15 @@ def test_validate_chars(x1: str, x2: str):
     validate_prop(list(x1), list(x2))
 
 
+@given(
+    hs.lists(hs.integers(0, 20), unique=True), hs.lists(hs.integers(0, 20), unique=True)
+)
+def test_keyed_distinct(x1: list, x2: list):
+    validate_prop(x1, x2)
+    recover_prop(x1, x2)
+    compose_prop(x1, x2, x1)
+
+
 @given(expanders())
 def test_expander_chars(x):
     expander_prop(x)
@@ -1,5 +1,5 @@
 from uxu.html import Html, h, div
-from uxu.manager import EventArgs, Manager
+from uxu.manager import EventArgs, Manager, render_static
 from uxu.patch import InvalidatePatch, Patch, ReplaceElementPatch
 from uxu.fiber import useState
 from uxu.rendering import (
@@ -9,11 +9,15 @@ from uxu.rendering import (
     Rendering,
     RootRendering,
     RenderedText,
+    iter_event_handlers,
 )
+import asyncio
+import json
 from itertools import product
+from miniscutil.ofdict import MyJsonEncoder, ofdict
 import pprint
 
-from uxu.patch import ModifyChildrenPatch
+from uxu.patch import ModifyAttributesPatch, ModifyChildrenPatch, coalesce_patches
 
 from hypothesis import given
 import hypothesis.strategies as st
@@ -138,3 +142,224 @@ async def test_button():
             "2",
         ]
         m.handle_event(ea)
+
+
+@pytest.mark.asyncio
+async def test_shared_update_loop():
+    def C(x: str):
+        y = useState(0)
+        return h(
+            "button",
+            [x, str(y.current)],
+            onclick=lambda _: y.modify(lambda n: n + 1),
+        )
+
+    with Manager() as m:
+        m.initialize(div(h(C, "a"), h(C, "b")))
+        r1 = m.render()
+        handlers = [eh for _, eh in iter_event_handlers(r1)]
+        assert len(handlers) == 2
+        for eh in handlers:
+            m.handle_event(EventArgs(eh.handler_id, name="onclick", params={}))
+        assert m.drain_handle is not None
+        ps = await m.wait_patches()
+        r3 = r1
+        for p in ps:
+            r3 = p.apply(r3)
+        r2 = m.render()
+        assert r2 == r3
+        texts = [t.value for t in iter_texts(r2)]
+        assert texts == ["a", "1", "b", "1"]
+
+
+def test_merge_attrs():
+    with Manager() as m:
+        m.initialize(div("hello", x="y", y="x"))
+        r1 = m.render()
+    e = r1.children[0]
+    assert isinstance(e, RenderedElement)
+    p1 = ModifyAttributesPatch(remove=["x"], add={"z": "1"}, element_id=e.id)
+    p2 = ModifyAttributesPatch(remove=["z", "y"], add={"x": "2"}, element_id=e.id)
+    expected = p2.apply(p1.apply(r1))
+    assert p1.merge(p2)
+    assert p1.apply(r1) == expected
+    p3 = ModifyAttributesPatch(remove=[], add={}, element_id="other")
+    assert not p1.merge(p3)
+
+
+def test_coalesce_patches():
+    with Manager() as m:
+        m.initialize(div(div("a", x="1"), div("b", y="1")))
+        r1 = m.render()
+    e = r1.children[0]
+    assert isinstance(e, RenderedElement)
+    a, b = [c.id for c in e.children if isinstance(c, RenderedElement)]
+    ps = [
+        ModifyAttributesPatch(remove=["x"], add={"z": "1"}, element_id=a),
+        ModifyAttributesPatch(remove=[], add={"y": "2"}, element_id=b),
+        ModifyAttributesPatch(remove=["z"], add={"x": "3"}, element_id=a),
+    ]
+    expected = r1
+    for p in ps:
+        expected = p.apply(expected)
+    cs = coalesce_patches(ps)
+    assert len(cs) == 2
+    r2 = r1
+    for p in cs:
+        r2 = p.apply(r2)
+    assert r2 == expected
+
+
+def test_render_static_fresh():
+    html = div("hello", h("p", "world", style={"color": "red"}))
+    r1 = render_static(html)
+    r2 = render_static(html)
+    assert r1 is not r2
+    assert not set(r1.get_ids()) & set(r2.get_ids())
+
+
+@pytest.mark.asyncio
+async def test_patch_burst():
+    with Manager() as m:
+        m.initialize(div("a", x="0"))
+        e = m.render().children[0]
+        waiter = asyncio.create_task(m.wait_patches())
+        await asyncio.sleep(0)
+        for i in range(10):
+            m._patch(ModifyAttributesPatch(remove=[], add={"x": str(i)}, element_id=e.id))
+        ps = await waiter
+        assert len(ps) == 1
+        assert ps[0].add == {"x": "9"}
+        assert m.get_patches() == []
+
+
+def test_get_ids():
+    r = render_static(div("a", div("b"), "c"))
+    ids = r.get_ids()
+    assert ids == r.get_ids()
+    assert len(ids) == len(set(ids)) == 6
+    assert ids[0] == r.id
+
+
+def test_static_html():
+    r = render_static(div(h("p", "x<y", cls="a", onclick=lambda _: 0), h("br")))
+    d = r.children[0]
+    assert isinstance(d, RenderedElement)
+    p, br = d.children
+    assert r.to_static_html() == (
+        f'<div data-uxu-id="{d.id}">'
+        f'<p class="a" data-uxu-id="{p.id}">x&lt;y</p>'
+        f'<br data-uxu-id="{br.id}">'
+        "</div>"
+    )
+
+
+def test_rendering_ofdict_roundtrip():
+    r = render_static(
+        div(h("p", "x", style={"color": "red"}, cls="a", onclick=lambda _: 0))
+    )
+    j = json.loads(json.dumps(r, cls=MyJsonEncoder))
+    assert ofdict(Rendering, j) == r
+
+
+def iter_texts(r: Rendering):
+    if isinstance(r, RenderedText):
+        yield r
+    for c in r.get_children():
+        yield from iter_texts(c)
+
+
+def test_normalise_html_deep():
+    from uxu.vdom import normalise_html
+
+    html: Html = "x"
+    for i in range(5000):
+        html = [html, None, str(i)] if i % 2 else [html]
+    specs = normalise_html(html)
+    assert [s.value for s in specs[:3]] == ["x", "1", "3"]
+    assert len(specs) == 2501
+
+
+@pytest.mark.asyncio
+async def test_patch_same_tick():
+    with Manager() as m:
+        m.initialize(div(div("a", x="0"), div("b", x="0")))
+        e1, e2 = m.render().children[0].children
+        waiter = asyncio.create_task(m.wait_patches())
+        await asyncio.sleep(0)
+        loop = asyncio.get_running_loop()
+        p1, p2 = [
+            ModifyAttributesPatch(remove=[], add={"x": "1"}, element_id=e.id)
+            for e in (e1, e2)
+        ]
+        # the second patch is queued after the waiter has been woken.
+        loop.call_soon(lambda: (m._patch(p1), loop.call_soon(m._patch, p2)))
+        ps = await waiter
+        assert {p.element_id for p in ps} == {e1.id, e2.id}
+
+
+@pytest.mark.asyncio
+async def test_wait_patches_never_empty():
+    with Manager() as m:
+        m.initialize(div("a", x="0"))
+        e = m.render().children[0]
+        noop = ModifyAttributesPatch(remove=[], add={}, element_id=e.id)
+        assert coalesce_patches([noop]) == []
+        m.pending_patches.append(noop)
+        waiter = asyncio.create_task(m.wait_patches())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        m._patch(ModifyAttributesPatch(remove=[], add={"x": "1"}, element_id=e.id))
+        ps = await waiter
+        assert [p.add for p in ps] == [{"x": "1"}]
+
+
+def test_element_spec_eq():
+    cs = ["a"]
+    x = h("div", cs)
+    cs.append("b")
+    assert x == h("div", "a")
+    assert x != h("div", "b")
+    assert h("div", "a", "b") == h("div", ["a", "b"])
+
+
+@pytest.mark.asyncio
+async def test_cancel_one_waiter():
+    with Manager() as m:
+        m.initialize(div("a", x="0"))
+        e = m.render().children[0]
+        w1 = asyncio.create_task(m.wait_patches())
+        w2 = asyncio.create_task(m.wait_patches())
+        await asyncio.sleep(0)
+        w1.cancel()
+        await asyncio.sleep(0)
+        m._patch(ModifyAttributesPatch(remove=[], add={"x": "1"}, element_id=e.id))
+        ps = await w2
+        assert w1.cancelled()
+        assert [p.add for p in ps] == [{"x": "1"}]
+
+
+def test_create_preorder():
+    r = render_static(div(div("a", div("b")), div("c")))
+    ids = [int(i.rsplit("-", 1)[1]) for i in r.get_ids()[1:]]
+    # root, then depth first in document order.
+    assert ids == sorted(ids)
+
+
+def test_duplicate_kind():
+    import types
+
+    other = types.ModuleType("other_renderings")
+    src = (
+        "from dataclasses import dataclass\n"
+        "from typing import ClassVar\n"
+        "from uxu.rendering import Rendering\n"
+        "@dataclass\n"
+        "class RenderedElement(Rendering):\n"
+        "    kind: ClassVar[str] = 'element'\n"
+        "    def static(self):\n"
+        "        return ''\n"
+    )
+    with pytest.raises(TypeError):
+        exec(src, other.__dict__)
+    assert Rendering.kind_map["element"] is RenderedElement
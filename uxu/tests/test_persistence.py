@@ -0,0 +1,218 @@
+import asyncio
+from dataclasses import dataclass, field
+from pathlib import Path
+import sqlite3
+from typing import Optional
+
+import pytest
+
+import uxu
+from uxu.html import div, h
+from uxu.manager import render_static
+from uxu.persistence import CachedPersistDict, PersistDict
+from uxu.rendering import RootRendering
+
+
+@dataclass
+class Params:
+    id: str
+    rendering: Optional[RootRendering] = None
+    params: dict = field(default_factory=dict)
+
+
+def make_params(i: int) -> Params:
+    r = render_static(div(h("p", f"item {i}", cls="a")))
+    return Params(id=str(i), rendering=r, params={"i": str(i)})
+
+
+@pytest.mark.parametrize("serializer", ["json", "msgpack"])
+def test_roundtrip(tmp_path, serializer):
+    if serializer == "msgpack":
+        pytest.importorskip("msgspec")
+    d = PersistDict(tmp_path / "db.sqlite", Params, serializer=serializer)
+    v = make_params(0)
+    d.set("a", v)
+    assert d.get("a") == v
+    assert "a" in d
+    assert "b" not in d
+    assert d.pop("a") == v
+    assert "a" not in d
+    with pytest.raises(KeyError):
+        d.pop("a")
+    with pytest.raises(KeyError):
+        d.get("a")
+
+
+def test_json_rows_readable_as_msgpack(tmp_path):
+    pytest.importorskip("msgspec")
+    path = tmp_path / "db.sqlite"
+    d = PersistDict(path, Params)
+    assert d.serializer == "json"
+    v = make_params(0)
+    d.set("a", v)
+    d.flush()
+    d2 = PersistDict(path, Params, serializer="msgpack")
+    assert d2.get("a") == v
+
+
+def test_unknown_serializer(tmp_path):
+    with pytest.raises(ValueError):
+        PersistDict(tmp_path / "db.sqlite", Params, serializer="pickle")  # type: ignore
+
+
+def test_batches(tmp_path):
+    d = PersistDict(tmp_path / "db.sqlite", dict)
+    d.set_many((f"k{i:03}", {"i": i}) for i in range(25))
+    assert [v["i"] for v in d.values_batch(["k003", "k001"], batch_size=1)] == [3, 1]
+    with pytest.raises(KeyError):
+        d.values_batch(["k001", "missing"])
+    keys = []
+    for k, v in d.items(batch_size=10):
+        keys.append(k)
+        # writing while iterating is fine, no cursor is held open.
+        d.delete("k024")
+    assert keys == [f"k{i:03}" for i in range(24)]
+    assert not d.conn.in_transaction
+
+
+@pytest.mark.parametrize("serializer", ["json", "msgpack"])
+def test_large_value(tmp_path, serializer):
+    if serializer == "msgpack":
+        pytest.importorskip("msgspec")
+    d = PersistDict(tmp_path / "db.sqlite", dict, serializer=serializer)
+    v = {"x": "y" * 200_000}
+    d.set("a", v)
+    assert d.get("a") == v
+
+
+def committed_count(path) -> int:
+    with sqlite3.connect(path) as c:
+        return c.execute("SELECT count(*) FROM dict").fetchone()[0]
+
+
+@pytest.mark.asyncio
+async def test_commit_interval(tmp_path):
+    path = tmp_path / "db.sqlite"
+    d = PersistDict(path, dict, commit_interval=3, commit_delay=60)
+    d.set("a", {})
+    d.set("b", {})
+    assert committed_count(path) == 0
+    d.set("c", {})
+    assert committed_count(path) == 3
+    assert d._commit_handle is None
+
+
+@pytest.mark.asyncio
+async def test_commit_delay(tmp_path):
+    path = tmp_path / "db.sqlite"
+    d = PersistDict(path, dict, commit_delay=0.01)
+    d.set("a", {})
+    assert committed_count(path) == 0
+    await asyncio.sleep(0.05)
+    assert committed_count(path) == 1
+    assert d._commit_handle is None
+    d.set("b", {})
+    d.set_many([("c", {})])
+    assert committed_count(path) == 3
+    assert d._commit_handle is None
+
+
+def test_commit_without_loop(tmp_path):
+    path = tmp_path / "db.sqlite"
+    d = PersistDict(path, dict, commit_delay=60)
+    d.set("a", {})
+    assert committed_count(path) == 1
+
+
+def test_commit_after_loop_closed(tmp_path):
+    path = tmp_path / "db.sqlite"
+    d = PersistDict(path, dict, commit_delay=0.01)
+
+    async def set_only(k):
+        d.set(k, {})
+
+    async def set_and_wait(k):
+        d.set(k, {})
+        await asyncio.sleep(0.05)
+
+    # the first loop closes before its commit timer fires.
+    asyncio.run(set_only("a"))
+    asyncio.run(set_and_wait("b"))
+    assert committed_count(path) == 2
+
+
+
+def test_cached_hit(tmp_path):
+    store = PersistDict(tmp_path / "db.sqlite", dict)
+    c = CachedPersistDict(store)
+    c.set("a", {"x": 1})
+    # a hit is answered from memory without reading the store.
+    store.set("a", {"x": 2})
+    assert c.get("a") == {"x": 1}
+    with pytest.raises(KeyError):
+        c.get("missing")
+
+
+@pytest.mark.asyncio
+async def test_cached_flush_delay(tmp_path):
+    path = tmp_path / "db.sqlite"
+    c = CachedPersistDict(PersistDict(path, dict, commit_interval=1), flush_delay=0.01)
+    c.set("a", {})
+    c.set("b", {})
+    assert committed_count(path) == 0
+    await asyncio.sleep(0.05)
+    assert committed_count(path) == 2
+    assert c._flush_handle is None
+    c.set("c", {})
+    await asyncio.sleep(0.05)
+    assert committed_count(path) == 3
+
+
+def test_cached_flush_after_loop_closed(tmp_path):
+    path = tmp_path / "db.sqlite"
+    c = CachedPersistDict(PersistDict(path, dict, commit_interval=1), flush_delay=0.01)
+
+    async def set_only(k):
+        c.set(k, {})
+
+    async def set_and_wait(k):
+        c.set(k, {})
+        await asyncio.sleep(0.05)
+
+    # the first loop closes before its flush timer fires.
+    asyncio.run(set_only("a"))
+    asyncio.run(set_and_wait("b"))
+    assert committed_count(path) == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_pop_async(tmp_path):
+    path = tmp_path / "db.sqlite"
+    store = PersistDict(path, dict, check_same_thread=False, commit_interval=1)
+    c = CachedPersistDict(store, flush_delay=60)
+    c.set("mem", {"x": 1})
+    store.set("disk", {"x": 2})
+    assert await c.pop_async("mem") == {"x": 1}
+    assert await c.pop_async("disk") == {"x": 2}
+    assert "disk" not in store
+    with pytest.raises(KeyError):
+        await c.pop_async("mem")
+    # the popped write never reaches the store.
+    c.flush()
+    assert committed_count(path) == 0
+
+
+@pytest.mark.asyncio
+async def test_lifespan_flush(tmp_path, monkeypatch):
+    pytest.importorskip("rich")
+    if not (Path(uxu.__file__).parent / "static").is_dir():
+        pytest.skip("uxu/static is only present once the client is built")
+    from uxu import serve
+
+    path = tmp_path / "db.sqlite"
+    c = CachedPersistDict(PersistDict(path, dict, commit_interval=1), flush_delay=60)
+    monkeypatch.setattr(serve.app, "persistence", c)
+    async with serve.app.lifespan(serve.app.webapp):
+        c.set("a", {})
+        assert committed_count(path) == 0
+    assert committed_count(path) == 1
@@ -1,19 +1,22 @@
-from dataclasses import dataclass
-from typing import ClassVar, Union
+from dataclasses import dataclass, field
+import sys
+from typing import ClassVar, Optional, Sequence, Union
 from .rendering import EventHandler, RenderedAttrVal
 from miniscutil import dict_diff
 import logging
-from .patch import ModifyAttributesPatch, ModifyChildrenPatch, ReplaceElementPatch
+from .patch import ModifyAttributesPatch, ReplaceElementPatch
 from .vdom import (
+    Html,
     Id,
     NormSpec,
     Vdom,
     VdomContext,
-    create,
-    dispose,
+    dispose_list,
     fresh_id,
     hydrate_lists,
+    normalise_html,
     patch,
+    patch_children,
     reconcile_lists,
     vdom_context,
 )
@@ -22,11 +25,48 @@ from .rendering import Rendering, RenderedElement
 logger = logging.getLogger("uxu")
 
 
-@dataclass
+def _handler_id(element_id: Id, attr: str) -> str:
+    # interned so that the event table and the rendered EventHandler share one string.
+    return sys.intern(f"{element_id}/{attr}")
+
+
+@dataclass(init=False, eq=False)
 class ElementSpec(NormSpec):
     tag: str
     attrs: dict
-    children: list[NormSpec]
+    raw_children: tuple[Html, ...]
+    _children: Optional[list[NormSpec]] = field(default=None, repr=False)
+
+    def __init__(self, tag: str, attrs: dict, children: Sequence[Html] = ()):
+        self.tag = sys.intern(tag)
+        self.attrs = attrs
+        self.raw_children = tuple(children)
+        self._children = None
+        if not all(isinstance(c, (str, NormSpec)) for c in self.raw_children):
+            # nested lists could be changed by the caller before we get to them.
+            self._children = normalise_html(self.raw_children)
+
+    def __eq__(self, other):
+        # compare the normalised children, `h("p", "a") == h("p", ["a"])`.
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.tag, self.attrs, self.children) == (
+            other.tag,
+            other.attrs,
+            other.children,
+        )
+
+    __hash__ = None  # type: ignore
+
+    @property
+    def children(self) -> list[NormSpec]:
+        """The normalised children, computed on first access.
+
+        Specs that a component builds and then throws away never pay for normalisation.
+        """
+        if self._children is None:
+            self._children = normalise_html(self.raw_children)
+        return self._children
 
     @property
     def key(self):
@@ -55,19 +95,37 @@ class Element(Vdom):
         return f"<{self.tag} {self.id}>"
 
     @classmethod
-    def create(cls, spec: ElementSpec):
+    def _create_childless(cls, spec: ElementSpec) -> "Element":
         id = fresh_id()
         attrs = {}
         for k, v in spec.attrs.items():
             if callable(v):
-                handler_id = f"{id}/{k}"
+                handler_id = _handler_id(id, k)
                 vdom_context.get()._register_event(handler_id, v)
                 v = EventHandler(handler_id)
             attrs[k] = v
-        elt = cls(
-            spec.tag, attrs=attrs, children=create(spec.children), id=id, key=spec.key
-        )
-        return elt
+        return cls(spec.tag, attrs=attrs, children=[], id=id, key=spec.key)
+
+    @classmethod
+    def create(cls, spec: ElementSpec):
+        # nested elements are built from a work stack rather than by recursion,
+        # other specs (fibers, text) create themselves.
+        # the stack holds an iterator per open element, so elements are still
+        # created in the same pre-order as the recursive version.
+        root = cls._create_childless(spec)
+        stack = [(root, iter(spec.children))]
+        while stack:
+            elt, child_specs = stack[-1]
+            for c in child_specs:
+                if type(c) is ElementSpec:
+                    child = cls._create_childless(c)
+                    elt.children.append(child)
+                    stack.append((child, iter(c.children)))
+                    break
+                elt.children.append(c.create())
+            else:
+                stack.pop()
+        return root
 
     @classmethod
     def hydrate(cls, r: Rendering, spec: ElementSpec) -> "Element":
@@ -82,7 +140,7 @@ class Element(Vdom):
             # [todo] abstract this attrs, registering loop.
             for k, v in spec.attrs.items():
                 if callable(v):
-                    handler_id = f"{id}/{k}"
+                    handler_id = _handler_id(id, k)
                     vdom_context.get()._register_event(handler_id, v)
                     v = EventHandler(handler_id)
                 new_attrs[k] = v
@@ -94,7 +152,7 @@ class Element(Vdom):
                 ModifyAttributesPatch(remove=remove, add={**add, **mod}, element_id=id)
             )
             children, reorder = hydrate_lists(r.children, spec.children)
-            patch(ModifyChildrenPatch(id, reorder))
+            patch_children(id, reorder)
             elt = cls(
                 spec.tag, attrs=new_attrs, children=children, id=r.id, key=spec.key
             )
@@ -105,7 +163,7 @@ class Element(Vdom):
         for k, v in self.attrs.items():
             if isinstance(v, EventHandler):
                 vdom_context.get()._unregister_event(v.handler_id)
-        dispose(self.children)
+        dispose_list(self.children)
 
     def render(self) -> Rendering:
         return RenderedElement(
@@ -123,7 +181,7 @@ class Element(Vdom):
         new_attrs = {}
         for k, v in new_attrs_spec.items():
             if callable(v):
-                handler_id = f"{self.id}/{k}"
+                handler_id = _handler_id(self.id, k)
                 vdom_context.get()._register_event(handler_id, v)
                 v = EventHandler(handler_id)
             new_attrs[k] = v
@@ -141,7 +199,7 @@ class Element(Vdom):
     def reconcile(self, new_spec: ElementSpec) -> "Element":
         assert isinstance(new_spec, ElementSpec)
         logger.debug(f"reconcile {str(self)} ← {str(new_spec)}")
-        if (self.key != new_spec.key) or (self.tag != new_spec.tag):
+        if self.key != new_spec.key or self.tag != new_spec.tag:
             self.dispose()
             v = new_spec.create()
             logger.debug(f"replacing {str(self)} → {str(v)}")
@@ -150,7 +208,7 @@ class Element(Vdom):
         self.reconcile_attrs(new_spec.attrs)
         children, r = reconcile_lists(self.children, new_spec.children)
         # [todo] apply expander to r here.
-        patch(ModifyChildrenPatch(element_id=self.id, reorder=r))
+        patch_children(self.id, r)
         self.tag = new_spec.tag
         self.children = children
         return self
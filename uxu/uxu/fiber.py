@@ -15,19 +15,20 @@ from typing import (
 )
 import warnings
 from .rendering import RenderedFragment, Rendering
-from .patch import ModifyChildrenPatch, ReplaceElementPatch
+from .patch import ReplaceElementPatch
 from .vdom import (
     Html,
     NormSpec,
     Vdom,
     VdomContext,
-    create,
-    dispose,
+    create_list,
+    dispose_list,
     fresh_id,
     hydrate,
     hydrate_lists,
     normalise_html,
     patch,
+    patch_children,
     vdom_context,
     reconcile_lists,
 )
@@ -58,6 +59,7 @@ class AbstractHook(Protocol):
 
 
 class StateHook(Generic[S]):
+    __slots__ = ("state", "fiber")
     state: S
     fiber: Optional["Fiber"]
 
@@ -100,6 +102,8 @@ class StateHook(Generic[S]):
 
 
 class EffectHook:
+    __slots__ = ("task", "callback", "deps")
+
     def __init__(self, callback, deps):
         self.task = None
         self.callback = callback
@@ -138,13 +142,15 @@ class EffectHook:
             self.callback = new_hook.callback
             self.evaluate()
 
-        if self.deps is None and new_hook.deps is None:
+        if self.deps is None or new_hook.deps is None:
             update()
+        elif self.deps is new_hook.deps:
+            pass
         elif len(self.deps) != len(new_hook.deps):
             update()
         else:
             for old_dep, new_dep in zip(self.deps, new_hook.deps):
-                if old_dep != new_dep:
+                if old_dep is not new_dep and old_dep != new_dep:
                     logger.debug(f"Dep changed {old_dep} -> {new_dep}")
                     update()
                     break
@@ -165,11 +171,41 @@ class FiberSpec(Generic[P], NormSpec):
     props_args: list
     props_kwargs: dict
     key: Optional[str] = field(default=None)
+    props_hash: Optional[int] = field(
+        default=None, init=False, compare=False, repr=False
+    )
+
+    def __post_init__(self):
+        # None when some prop is unhashable.
+        try:
+            self.props_hash = hash(
+                (tuple(self.props_args), frozenset(self.props_kwargs.items()))
+            )
+        except TypeError:
+            self.props_hash = None
 
     @property
     def name(self):
         return getattr(self.component, "__name__", "unknown")
 
+    def props_eq(self, other: "FiberSpec") -> bool:
+        """Cheap identity and hash checks before falling back to structural equality."""
+        if (
+            self.props_args is other.props_args
+            and self.props_kwargs is other.props_kwargs
+        ):
+            return True
+        if (
+            self.props_hash is not None
+            and other.props_hash is not None
+            and self.props_hash != other.props_hash
+        ):
+            return False
+        return (
+            self.props_args == other.props_args
+            and self.props_kwargs == other.props_kwargs
+        )
+
     def create(self):
         return Fiber.create(self)
 
@@ -187,7 +223,22 @@ class Fiber(Vdom):
     """Like React fibers."""
 
     spec_type: ClassVar = FiberSpec
-
+    __slots__ = (
+        "id",
+        "key",
+        "spec",
+        "component",
+        "props_args",
+        "props_kwargs",
+        "hooks",
+        "hook_idx",
+        "rendered",
+        "invalidated",
+        "_reset_ticket",
+    )
+
+    id: Optional[str]
+    spec: FiberSpec
     component: "Component"
     props_args: list
     props_kwargs: dict
@@ -195,8 +246,7 @@ class Fiber(Vdom):
     hooks: list[AbstractHook]
     hook_idx: int
     rendered: list[Vdom]
-    invalidated_event: asyncio.Event
-    update_loop_task: asyncio.Task
+    invalidated: bool
 
     @property
     def name(self) -> str:
@@ -215,33 +265,31 @@ class Fiber(Vdom):
         with self:
             s = self.component(*self.props_args, **self.props_kwargs)
             children, reorder = hydrate_lists(render.children, normalise_html(s))
-            patch(ModifyChildrenPatch(self.id, reorder))
+            patch_children(self.id, reorder)
             self.rendered = children
 
     def _create(self):
-        if hasattr(self, "rendered"):
+        if self.id is not None:
             raise RuntimeError("fiber is already initialized")
         self.id = fresh_id()
         with self:
             s = self.component(*self.props_args, **self.props_kwargs)
-            self.rendered = create(normalise_html(s))
-
-    def start(self):
-        if hasattr(self, "update_loop_task"):
-            raise RuntimeError("fiber is already running")
-        self.invalidated_event = asyncio.Event()
-        self.update_loop_task = asyncio.create_task(self._update_loop())
+            self.rendered = create_list(normalise_html(s))
 
     def __init__(self, spec: "FiberSpec"):
         # [todo] enforce this shouldn't be called directly, use Fiber.create or Fiber.hydrate
         self.key = spec.key  # type: ignore
+        self.spec = spec
         self.component = spec.component
         self.props_args = spec.props_args
         self.props_kwargs = spec.props_kwargs
         if not hasattr(self.component, "__name__"):
             logger.warning(f"Please name component {self.component}.")
+        self.id = None
         self.hooks = []
         self.hook_idx = 0
+        self.rendered = []
+        self.invalidated = False
         # now you need to run either _create() or _hydrate()
 
     def __enter__(self):
@@ -251,68 +299,52 @@ class Fiber(Vdom):
     def __exit__(self, exc_type, exc_val, exc_tb):
         fiber_context.reset(self._reset_ticket)
 
-    async def _update_loop(self):
-        while True:
-            await self.invalidated_event.wait()
-            logger.debug(f"{str(self)} rerendering.")
-            self.invalidated_event.clear()
-            try:
-                self.reconcile_core()
-            except Exception as e:
-                logger.exception("failure in update loop")
-
     def dispose(self):
         # [todo] can I just use GC?
-        assert hasattr(self, "hooks")
-        assert hasattr(
-            self, "rendered"
-        ), "Fiber not initialized with _create or _hydrate"
-        if hasattr(self, "rendered"):
-            dispose(self.rendered)
+        dispose_list(self.rendered)
         for hook in reversed(self.hooks):
             hook.dispose()
-        if hasattr(self, "update_loop_task"):
-            self.update_loop_task.cancel()
+        self.invalidated = False
 
     def invalidate(self):
         """Called when a hook's callback is invoked, means that a re-render must occur."""
         logger.debug(f"{str(self)} invalidated")
-        if vdom_context.get().is_static:
+        ctx = vdom_context.get()
+        if ctx.is_static:
             warnings.warn(
                 "fiber was invalidated but vdom context is in static mode, so fiber update loop is not running"
             )
-        self.invalidated_event.set()
+            return
+        self.invalidated = True
+        ctx._invalidate(self)
 
     def reconcile_hook(self, hook: H) -> H:
-        if self.hook_idx >= len(self.hooks):
-            # initialisation case
-            self.hooks.append(hook)
-            self.hook_idx += 1
-            hook.initialize()
-            return hook
-
-        old_hook = self.hooks[self.hook_idx]
-        if type(old_hook) != type(hook):
+        idx = self.hook_idx
+        hooks = self.hooks
+        self.hook_idx = idx + 1
+        if idx < len(hooks):
+            old_hook = hooks[idx]
+            if type(old_hook) is type(hook):
+                # steady state: same hook layout as the last render.
+                return old_hook.reconcile(hook)  # type: ignore
             logger.error(
-                f"{self} {self.hook_idx}th hook changed type from {str(old_hook)} to {str(hook)}"
+                f"{self} {idx}th hook changed type from {str(old_hook)} to {str(hook)}"
             )
             old_hook.dispose()
-            self.hooks[self.hook_idx] = hook
-            hook.initialize()
-            self.hook_idx += 1
-            return hook
+            hooks[idx] = hook
         else:
-            self.hook_idx += 1
-            return old_hook.reconcile(hook)  # type: ignore
+            # initialisation case
+            hooks.append(hook)
+        hook.initialize()
+        return hook
 
     def reconcile_core(self):
-        self.invalidated_event.clear()
+        self.invalidated = False
         t = fiber_context.set(self)
         self.hook_idx = 0
         try:
             spec = self.component(*self.props_args, **self.props_kwargs)
         except NoNeedToRerender:
-            assert hasattr(self, "rendered")
             logger.debug(f"{str(self)} Skipping re-render")
             return
         except Exception as e:
@@ -325,16 +357,16 @@ class Fiber(Vdom):
         children, reorder = reconcile_lists(self.rendered, spec)
         self.rendered = children
         l = self.hook_idx + 1
-        old_hooks = self.hooks[l:]
-        self.hooks = self.hooks[:l]
-        for hook in reversed(old_hooks):
-            hook.dispose()
-        patch(ModifyChildrenPatch(self.id, reorder))
+        if len(self.hooks) > l:
+            old_hooks = self.hooks[l:]
+            del self.hooks[l:]
+            for hook in reversed(old_hooks):
+                hook.dispose()
+        patch_children(self.id, reorder)
         return
 
     def reconcile(self, new_spec: "FiberSpec") -> "Fiber":
         assert isinstance(new_spec, FiberSpec)
-        assert hasattr(self, "hooks") and hasattr(self, "rendered"), "not created"
         # if the identity of the component function has changed that
         # means we should rerender.
         if new_spec.name != self.name or self.component is not new_spec.component:
@@ -343,14 +375,13 @@ class Fiber(Vdom):
             new_render: Rendering = new_fiber.render()
             patch(ReplaceElementPatch(element_id=self.id, new_element=new_render))
             return new_fiber
-        # [todo] check whether the props have changed here
         if (
-            self.props_args == new_spec.props_args
-            and self.props_kwargs == new_spec.props_kwargs
-            and not self.invalidated_event.is_set()
+            self.spec.props_eq(new_spec)
+            and not self.invalidated
         ):
             logger.debug(f"{str(self)} has unchanged props. Skipping re-render.")
             return self
+        self.spec = new_spec
         self.props_args = new_spec.props_args
         self.props_kwargs = new_spec.props_kwargs
         self.reconcile_core()
@@ -365,16 +396,12 @@ class Fiber(Vdom):
     def create(cls, spec: FiberSpec) -> "Fiber":
         f = cls(spec)
         f._create()
-        if not vdom_context.get().is_static:
-            f.start()
         return f
 
     @classmethod
     def hydrate(cls, render: Rendering, spec: FiberSpec) -> "Fiber":
         f = cls(spec)
         f._hydrate(render)
-        if not vdom_context.get().is_static:
-            f.start()
         return f
 
 
@@ -31,8 +31,7 @@ def h(tag, *children, key=None, **kwargs) -> Union[ElementSpec, FiberSpec]:  # t
         attrs = kwargs
         if key is not None:
             attrs["key"] = key
-        all_children = normalise_html(list(children))
-        return ElementSpec(tag=tag, attrs=attrs, children=all_children)
+        return ElementSpec(tag=tag, attrs=attrs, children=children)
     elif callable(tag):
         args = list(children)
         return FiberSpec(component=tag, props_args=args, key=key, props_kwargs=kwargs)
@@ -1,11 +1,12 @@
-from collections import Counter, defaultdict
+from bisect import bisect_left
+from collections import defaultdict
 from dataclasses import dataclass, replace
 from enum import Enum
 from functools import partial
 from typing import Any, Callable, Generic, Iterable, Optional, TypeVar, Union
 from difflib import SequenceMatcher
 
-from miniscutil import map_keys, Sum
+from miniscutil import Sum
 
 A = TypeVar("A")
 B = TypeVar("B")
@@ -19,6 +20,17 @@ class Reorder(Generic[A]):
     You should not instantiate this yourself, instead use the `diff` function.
     """
 
+    __slots__ = (
+        "l1_len",
+        "l2_len",
+        "remove_these",
+        "then_insert_these",
+        # computed on first access; a Reorder is not mutated after construction.
+        "_deletions",
+        "_creations",
+        "_moves",
+    )
+
     l1_len: int
     l2_len: int
     remove_these: dict[int, Optional[str]]
@@ -27,18 +39,25 @@ class Reorder(Generic[A]):
     def apply(self, l1: list[A]) -> list[A]:
         if len(l1) < self.l1_len:
             raise ValueError(f"list length ({len(l1)}) must be at least {self.l1_len}")
-        l2 = []
+        remove_these = self.remove_these
+        insert_these = self.then_insert_these
+        kept = []
         removed = {}
-        for i in range(len(l1)):
-            if i in self.remove_these:
-                k = self.remove_these[i]
+        for i, x in enumerate(l1):
+            if i in remove_these:
+                k = remove_these[i]
                 if k is not None:
-                    removed[k] = l1[i]
+                    removed[k] = x
             else:
-                l2.append(l1[i])
-        for j in sorted(self.then_insert_these.keys()):
-            o = self.then_insert_these[j].match(lambda k: removed[k], lambda t: t)
-            l2.insert(j, o)
+                kept.append(x)
+        # fill a pre-sized list rather than shifting the tail with list.insert.
+        l2: list[Any] = [None] * (len(kept) + len(insert_these))
+        for j, v in insert_these.items():
+            l2[j] = removed[v.value] if v.is_left else v.value
+        kept_iter = iter(kept)
+        for j in range(len(l2)):
+            if j not in insert_these:
+                l2[j] = next(kept_iter)
         return l2
 
     def map_inserts(self, fn: Callable[[int, A], B]) -> "Reorder[B]":
@@ -100,10 +119,11 @@ class Reorder(Generic[A]):
             k: v.map(left=lambda v: f"2-{v}", right=lambda a: a)
             for k, v in after.then_insert_these.items()
         }
+        # where each surviving intermediate index ends up in the final list.
+        l3_index = {s.value: k for k, s in enumerate(l3) if s.is_left}
         for j, v in δ1.then_insert_these.items():
-            try:
-                k = l3.index(Sum.inl(j))
-            except ValueError:
+            k = l3_index.get(j)
+            if k is None:
                 continue
             if v.is_left:
                 s = v.value
@@ -130,8 +150,10 @@ class Reorder(Generic[A]):
         return Reorder(
             length + self.l1_len,
             length + self.l2_len,
-            remove_these=map_keys(lambda i: i + length, self.remove_these),
-            then_insert_these=map_keys(lambda j: j + length, self.then_insert_these),
+            remove_these={i + length: v for i, v in self.remove_these.items()},
+            then_insert_these={
+                j + length: v for j, v in self.then_insert_these.items()
+            },
         )
 
     def extend_right(self, length: int) -> "Reorder[A]":
@@ -146,8 +168,9 @@ class Reorder(Generic[A]):
         """Horizontally concatenate `self` and `other`."""
         δ1 = self._map_keys(lambda s: f"a-{s}")
         δ2 = other._map_keys(lambda s: f"b-{s}")
-        r2 = map_keys(lambda i: δ1.l1_len + i, δ2.remove_these)
-        i2 = map_keys(lambda j: δ1.l2_len + j, δ2.then_insert_these)
+        n1, n2 = δ1.l1_len, δ1.l2_len
+        r2 = {n1 + i: v for i, v in δ2.remove_these.items()}
+        i2 = {n2 + j: v for j, v in δ2.then_insert_these.items()}
         r = {**δ1.remove_these, **r2}
         i = {**δ1.then_insert_these, **i2}
 
@@ -160,7 +183,6 @@ class Reorder(Generic[A]):
 
     def expand_elements(self, i_to_len: dict[int, int]) -> "Reorder[A]":
         """Return the reordering when the given l1 indices are expanded at the given index."""
-        bloat = sum(i_to_len.values())
         nr = 0
         ni = 0
         r = {}
@@ -179,26 +201,27 @@ class Reorder(Generic[A]):
                 nr += l - 1
             elif i in self.remove_these:
                 r[i + nr] = self.remove_these[i]
-        l2 = self.map_inserts(lambda j, a: Sum.inr(a)).apply(list(map(Sum.inl, range(self.l1_len))))  # type: ignore
-        for j, ia in enumerate(l2):
-            if ia.is_left:
-                i: int = ia.value
-                if i in i_to_len:
-                    l = i_to_len[i]
-                    if j in self.then_insert_these:
-                        ka = self.then_insert_these[j]
-                        assert ka.is_left
-                        s: str = ka.value
-                        for k in range(l):
-                            ins[j + ni + k] = Sum.inl(f"{k}-{s}")
-                    ni += l - 1
-                else:
-                    if j in self.then_insert_these:
-                        ins[j + ni] = self.then_insert_these[j]
-
+        # walk the l1 index landing at each l2 position, without materialising l2.
+        named = {v: i for i, v in self.remove_these.items() if v is not None}
+        kept = (i for i in range(self.l1_len) if i not in self.remove_these)
+        for j in range(self.l2_len):
+            v = self.then_insert_these.get(j)
+            if v is None:
+                i = next(kept)
+            elif v.is_left:
+                i = named[v.value]
             else:
-                a: A = ia.value
-                ins[j + ni] = ia
+                ins[j + ni] = v
+                continue
+            if i in i_to_len:
+                l = i_to_len[i]
+                if v is not None:
+                    s: str = v.value
+                    for k in range(l):
+                        ins[j + ni + k] = Sum.inl(f"{k}-{s}")
+                ni += l - 1
+            elif v is not None:
+                ins[j + ni] = v
 
         return Reorder(
             l1_len=nr,
@@ -231,22 +254,38 @@ class Reorder(Generic[A]):
         return len(self.remove_these) == 0 and len(self.then_insert_these) == 0
 
     @property
-    def deletions(self):
+    def deletions(self) -> list[int]:
         """Get the indices of items in the first list that are deleted."""
-        for i in self.remove_these.keys():
-            if self.remove_these[i] is None:
-                yield i
+        try:
+            return self._deletions
+        except AttributeError:
+            pass
+        self._deletions = [i for i, v in self.remove_these.items() if v is None]
+        return self._deletions
 
     @property
-    def creations(self):
+    def creations(self) -> list[int]:
         """Get the indices of items in the second list that are created."""
-        for j, v in self.then_insert_these.items():
-            if not v.is_left:
-                yield j
+        try:
+            return self._creations
+        except AttributeError:
+            pass
+        self._creations = [
+            j for j, v in self.then_insert_these.items() if not v.is_left
+        ]
+        return self._creations
 
     @property
-    def moves(self) -> Iterable[tuple[int, int]]:
+    def moves(self) -> list[tuple[int, int]]:
         """Get pairs of i,j indices of all pairs of values that appear in both lists."""
+        try:
+            return self._moves
+        except AttributeError:
+            pass
+        self._moves = list(self._iter_moves())
+        return self._moves
+
+    def _iter_moves(self) -> Iterable[tuple[int, int]]:
         rm = {}
         count = 0
         for i in range(self.l1_len):
@@ -280,28 +319,90 @@ class Reorder(Generic[A]):
         assert len(rm) == 0, f"Remaining: {rm}, {self}"
 
 
-def deduplicate_values(d: dict):
+def deduplicate_values(d: dict[Any, str]):
     acc = {}
-    c = Counter()
+    c: defaultdict[str, int] = defaultdict(int)
     for k, v in d.items():
         n = c[v]
-        acc[k] = f"{v}-{n}"
-        c[v] += 1
+        acc[k] = v + "-" + str(n)
+        c[v] = n + 1
     return acc
 
 
+def _longest_increasing(xs: list[int]) -> set[int]:
+    """Indices of a longest strictly increasing subsequence of `xs`."""
+    tails: list[int] = []  # tails[k] is the index ending the best run of length k+1
+    tail_values: list[int] = []
+    prev = [-1] * len(xs)
+    for n, x in enumerate(xs):
+        k = bisect_left(tail_values, x)
+        if k > 0:
+            prev[n] = tails[k - 1]
+        if k == len(tails):
+            tails.append(n)
+            tail_values.append(x)
+        else:
+            tails[k] = n
+            tail_values[k] = x
+    result = set()
+    n = tails[-1] if tails else -1
+    while n != -1:
+        result.add(n)
+        n = prev[n]
+    return result
+
+
+def _keyed_diff(l1: list[A], l2: list[A]) -> Optional[Reorder[A]]:
+    """Diff for when no item is repeated within either list, as with keyed children.
+
+    Items that appear in both lists are kept in place along a longest increasing
+    run and moved otherwise. Runs in O(n log n) rather than SequenceMatcher's O(nm).
+    Returns None if either list contains duplicates.
+    """
+    k1 = {x: i for i, x in enumerate(l1)}
+    if len(k1) != len(l1):
+        return None
+    k2 = {x: j for j, x in enumerate(l2)}
+    if len(k2) != len(l2):
+        return None
+    # (i, j) pairs of shared items, in l1 order.
+    common = [(i, k2[x]) for i, x in enumerate(l1) if x in k2]
+    keep = _longest_increasing([j for _, j in common])
+    remove_these: dict[int, Optional[str]] = {}
+    then_insert_these: dict[int, Sum[str, A]] = {}
+    for n, (i, j) in enumerate(common):
+        if n not in keep:
+            remove_these[i] = str(i)
+            then_insert_these[j] = Sum.inl(str(i))
+    for i, x in enumerate(l1):
+        if x not in k2:
+            remove_these[i] = None
+    for j, x in enumerate(l2):
+        if x not in k1:
+            then_insert_these[j] = Sum.inr(x)
+    return Reorder(
+        len(l1), len(l2), remove_these=remove_these, then_insert_these=then_insert_these
+    )
+
+
 def diff(l1: list[A], l2: list[A]) -> Reorder[A]:
+    keyed = _keyed_diff(l1, l2)
+    if keyed is not None:
+        return keyed
     removes = dict()
     co_removes = dict()
+    # name each distinct item by its first-seen order. Unlike str(hash(x)), unequal
+    # items can't collide on a name.
+    names: dict[Any, str] = {}
     codes = SequenceMatcher(None, l1, l2).get_opcodes()
     for tag, i1, i2, j1, j2 in codes:
         if tag == "replace" or tag == "delete":
             for i in range(i1, i2):
-                removes[i] = str(hash(l1[i]))
+                removes[i] = names.setdefault(l1[i], str(len(names)))
         if tag == "replace" or tag == "insert":
             for j in range(j1, j2):
                 assert j not in co_removes
-                co_removes[j] = str(hash(l2[j]))
+                co_removes[j] = names.setdefault(l2[j], str(len(names)))
     # deduplicate
     removes = deduplicate_values(removes)
     co_removes = deduplicate_values(co_removes)
@@ -1,24 +1,25 @@
 import asyncio
+from collections import deque
 from dataclasses import dataclass, field
-import inspect
 import logging
+import sys
 from typing import Any, Callable, Optional
 from .html import Html
 from .vdom import (
     Id,
     Vdom,
-    dispose,
+    dispose_list,
     fresh_id,
     hydrate_lists,
     reconcile_lists,
-    create,
-    render,
+    create_list,
+    render_list,
     normalise_html,
+    patch_children,
     set_vdom_context,
 )
-from .patch import ModifyChildrenPatch, Patch
+from .patch import Patch, coalesce_patches
 from .rendering import RootRendering, Rendering
-from miniscutil.asyncio_helpers import MessageQueue
 
 logger = logging.getLogger("uxu")
 
@@ -37,14 +38,21 @@ class Manager:
     event_table: dict[str, Callable]
     event_tasks: set[asyncio.Task]
     root: list[Vdom]
-    pending_patches: MessageQueue[Patch]
+    pending_patches: deque[Patch]
+    patches_waiter: Optional[asyncio.Future]
+    """ Resolved by the next `_patch`, shared by everyone in `wait_patches`. """
+    invalidated_fibers: dict[Any, None]
+    drain_handle: Optional[asyncio.Handle]
 
     def __init__(self, spec: Optional[Html] = None, is_static: bool = False):
         self.is_static = is_static
 
         self.event_table = {}
         self.event_tasks = set()
-        self.pending_patches = MessageQueue()
+        self.pending_patches = deque()
+        self.patches_waiter = None
+        self.invalidated_fibers = {}
+        self.drain_handle = None
         if spec is not None:
             self.initialize(spec)
 
@@ -63,7 +71,7 @@ class Manager:
         with set_vdom_context(self):
             self.id = fresh_id()
             spec = normalise_html(html)
-            self.root = create(spec)
+            self.root = create_list(spec)
 
     def hydrate(self, old: RootRendering, html: Html):
         if self.is_initialized:
@@ -73,12 +81,7 @@ class Manager:
             spec = normalise_html(html)
             new_root, reorder = hydrate_lists(old.children, spec)
             self.root = new_root
-            self._patch(
-                ModifyChildrenPatch(
-                    element_id=self.id,
-                    reorder=reorder,
-                )
-            )
+            patch_children(self.id, reorder)
 
     def update(self, html: Html):
         if not self.is_initialized:
@@ -87,20 +90,15 @@ class Manager:
             spec = normalise_html(html)
             new_root, reorder = reconcile_lists(self.root, spec)
             self.root = new_root
-            self._patch(
-                ModifyChildrenPatch(
-                    element_id=self.id,
-                    reorder=reorder,
-                )
-            )
+            patch_children(self.id, reorder)
 
     @property
     def is_initialized(self):
         return hasattr(self, "root")
 
     def render(self) -> RootRendering:
-        self.pending_patches.clear()
-        children = render(self.root)
+        self._pop_patches()
+        children = render_list(self.root)
         return RootRendering(
             id=self.id,
             children=children,
@@ -112,16 +110,58 @@ class Manager:
             return
         for t in self.event_tasks:
             t.cancel()
+        if self.drain_handle is not None:
+            self.drain_handle.cancel()
+            self.drain_handle = None
+        self.invalidated_fibers.clear()
         with set_vdom_context(self):
-            dispose(self.root)
+            dispose_list(self.root)
             delattr(self, "root")
-        self.pending_patches.clear()
+        self._pop_patches()
         self.event_table.clear()
 
     def _patch(self, patch: Patch):
         if patch.is_empty:
             return
-        self.pending_patches.push(patch)
+        # bursts of patches to the same element during a reconcile become one patch.
+        if self.pending_patches and self.pending_patches[-1].merge(patch):
+            return
+        self.pending_patches.append(patch)
+        w = self.patches_waiter
+        if w is not None:
+            # wake the waiter directly rather than going through asyncio.Event.
+            # This only schedules it, so the rest of this turn's patches are still
+            # collected and the waiter drains the whole burst in one go.
+            self.patches_waiter = None
+            if not w.done():
+                w.set_result(None)
+
+    def _pop_patches(self) -> list[Patch]:
+        patches = list(self.pending_patches)
+        self.pending_patches.clear()
+        return patches
+
+    def _invalidate(self, fiber):
+        # all invalidations within one tick are re-rendered by a single drain.
+        self.invalidated_fibers[fiber] = None
+        if self.drain_handle is None:
+            loop = asyncio.get_running_loop()
+            self.drain_handle = loop.call_soon(self._drain_invalidated)
+
+    def _drain_invalidated(self):
+        self.drain_handle = None
+        fibers = list(self.invalidated_fibers)
+        self.invalidated_fibers.clear()
+        with set_vdom_context(self):
+            for fiber in fibers:
+                if not fiber.invalidated:
+                    # already re-rendered by an ancestor, or disposed.
+                    continue
+                logger.debug(f"{str(fiber)} rerendering.")
+                try:
+                    fiber.reconcile_core()
+                except Exception:
+                    logger.exception("failure in update loop")
 
     def _register_event(self, k: str, handler: Callable):
         if self.is_static:
@@ -142,14 +182,18 @@ class Manager:
             assert isinstance(params, EventArgs)
             logger.debug(f"handling {params.handler_id}")
             k = params.handler_id
-            if k not in self.event_table:
+            if type(k) is str:
+                # ids arriving from the client are fresh strings, interning lets the
+                # lookup match the registered key by identity.
+                k = sys.intern(k)
+            handler = self.event_table.get(k)
+            if handler is None:
                 logger.debug(f"No handler for {params.handler_id}")
                 return
-            assert k in self.event_table
-            handler = self.event_table[k]
 
             r = handler(params.params)
-            if inspect.iscoroutine(r):
+            # handlers can be plain functions that return a coroutine, so check the result.
+            if asyncio.iscoroutine(r):
                 et = asyncio.create_task(r)
                 self.event_tasks.add(et)
                 et.add_done_callback(self.event_tasks.discard)
@@ -161,13 +205,28 @@ class Manager:
     async def wait_patches(self):
         if self.is_static:
             raise RuntimeError("cannot handle patching loop in static mode")
-        return await self.pending_patches.wait_pop_many()
+        # never returns an empty list, so callers can send whatever they get.
+        while True:
+            if not self.pending_patches:
+                while not self.pending_patches:
+                    w = self.patches_waiter
+                    if w is None or w.done():
+                        loop = asyncio.get_running_loop()
+                        w = self.patches_waiter = loop.create_future()
+                    # shielded, cancelling one waiter mustn't cancel the others.
+                    await asyncio.shield(w)
+                # woken by the first patch, let the rest of this tick's callbacks
+                # add theirs so that they go to the client in the same message.
+                await asyncio.sleep(0)
+            patches = coalesce_patches(self._pop_patches())
+            if patches:
+                return patches
 
     def get_patches(self):
         if self.is_static:
             return []
         else:
-            return self.pending_patches.pop_all()
+            return coalesce_patches(self._pop_patches())
 
 
 def render_static(html: Html) -> RootRendering:
@@ -1,4 +1,4 @@
-from dataclasses import dataclass, field, is_dataclass, replace
+from dataclasses import dataclass, field
 from typing import Any, Union
 
 from .rendering import Rendering, RenderedElement, RenderedAttrVal, RootRendering
@@ -16,9 +16,15 @@ from abc import ABC, abstractmethod
 
 class Patch(ABC):
     kind: str
+    # plain attribute rather than a property, subclasses set it in __post_init__.
+    is_empty = False
 
-    @property
-    def is_empty(self):
+    def merge(self, after: "Patch") -> bool:
+        """Fold `after` into this patch in place, so that applying `self` is equivalent
+        to applying the old `self` followed by `after`.
+
+        Returns False, leaving `self` unchanged, if the patches can't be combined.
+        """
         return False
 
     @abstractmethod
@@ -48,16 +54,29 @@ class ModifyAttributesPatch(Patch):
     element_id: str
     kind: str = field(default="modify-attrs")
 
-    @property
-    def is_empty(self) -> bool:
-        return len(self.remove) == 0 and len(self.add) == 0
+    def __post_init__(self):
+        self.is_empty = len(self.remove) == 0 and len(self.add) == 0
+
+    def merge(self, after: Patch) -> bool:
+        if not isinstance(after, ModifyAttributesPatch):
+            return False
+        if after.element_id != self.element_id:
+            return False
+        remove = [k for k in self.remove if k not in after.add]
+        remove.extend(k for k in after.remove if k not in remove)
+        add = {k: v for k, v in self.add.items() if k not in after.remove}
+        add.update(after.add)
+        self.remove = remove
+        self.add = add
+        self.__post_init__()
+        return True
 
     def apply(self, root: RootRendering):
         def visit(r: Rendering):
             assert isinstance(r, RenderedElement), "invalid id"
             attrs = {k: v for k, v in r.attrs.items() if k not in self.remove}
             attrs.update(self.add)
-            return replace(r, attrs=attrs)
+            return r.with_attrs(attrs)
 
         return root.lens_id(self.element_id, visit)
 
@@ -68,16 +87,24 @@ class ModifyChildrenPatch(Patch):
     reorder: Reorder[Rendering]
     kind: str = field(default="modify-children")
 
-    @property
-    def is_empty(self) -> bool:
-        return self.reorder.is_identity
+    def __post_init__(self):
+        self.is_empty = self.reorder.is_identity
+
+    def merge(self, after: Patch) -> bool:
+        if not isinstance(after, ModifyChildrenPatch):
+            return False
+        if after.element_id != self.element_id:
+            return False
+        if self.reorder.l2_len != after.reorder.l1_len:
+            return False
+        self.reorder = self.reorder.compose(after.reorder)
+        self.__post_init__()
+        return True
 
     def apply(self, root: RootRendering):
         def visit(r: Rendering):
             cs: list[Rendering] = getattr(r, "children")
-            cs2 = self.reorder.apply(cs)
-            assert is_dataclass(r)
-            return replace(r, children=cs2)
+            return r.with_children(self.reorder.apply(cs))
 
         return root.lens_id(self.element_id, visit)
 
@@ -99,3 +126,27 @@ class ReplaceRootPatch(Patch):
 
     def apply(self, root: RootRendering):
         return self.root
+
+
+def coalesce_patches(patches: list[Patch]) -> list[Patch]:
+    """Fold patches that can be merged, keeping the order of the rest.
+
+    Adjacent patches are merged with `Patch.merge`. Attribute patches don't change
+    the structure of the tree, so a run of them is folded per element even when
+    patches to other elements are interleaved. Merged patches are modified in place,
+    and any that cancel out to nothing are dropped.
+    """
+    out: list[Patch] = []
+    attrs_run: dict[Any, ModifyAttributesPatch] = {}
+    for p in patches:
+        if isinstance(p, ModifyAttributesPatch):
+            prev = attrs_run.get(p.element_id)
+            if prev is not None and prev.merge(p):
+                continue
+            attrs_run[p.element_id] = p
+        else:
+            attrs_run.clear()
+            if out and out[-1].merge(p):
+                continue
+        out.append(p)
+    return [p for p in out if not p.is_empty]
@@ -1,35 +1,125 @@
 """ Simple sqlite persistence layer for uxu """
+import asyncio
+from collections import OrderedDict
+import threading
 from pathlib import Path
 import sqlite3
-from typing import Generic, Iterable, Type, TypeVar
-from miniscutil.ofdict import TypedJsonDecoder, MyJsonEncoder
+from typing import Generic, Iterable, Literal, Optional, Type, TypeVar
+from miniscutil.ofdict import (
+    TypedJsonDecoder,
+    MyJsonEncoder,
+    ofdict,
+    todict_rec,
+)
 import json
 
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
 T = TypeVar("T")
 
+Serializer = Literal["msgpack", "json"]
+
 
 class PersistDict(Generic[T]):
-    """Super simple sqlite backed dictionary with json serialisation."""
+    """Super simple sqlite backed dictionary.
+
+    Values are stored as json, or as msgpack with `serializer="msgpack"`, which
+    needs the `msgpack` extra. Rows written as json are still readable after
+    switching to msgpack.
+    """
 
-    def __init__(self, path: Path, T: Type[T], table_name: str = "dict"):
+    def __init__(
+        self,
+        path: Path,
+        T: Type[T],
+        table_name: str = "dict",
+        serializer: Serializer = "json",
+        check_same_thread: bool = True,
+        commit_interval: int = 100,
+        commit_delay: float = 0.05,
+    ):
         self.table_name = table_name
         if not path.exists():
             path.parent.mkdir(parents=True, exist_ok=True)
         self.T = T
-        self.conn = sqlite3.connect(path)
+        if serializer not in ("json", "msgpack"):
+            raise ValueError(f"unknown serializer {serializer!r}")
+        if serializer == "msgpack" and msgspec is None:
+            raise ImportError("msgpack serialization requires the msgspec package")
+        self.serializer = serializer
+        self.commit_interval = commit_interval
+        self.commit_delay = commit_delay
+        self._uncommitted = 0
+        self._commit_handle: Optional[asyncio.TimerHandle] = None
+        self._commit_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._json_decoder = TypedJsonDecoder(T)
+        if msgspec is not None:
+            self._encoder = msgspec.msgpack.Encoder()
+            self._decoder = msgspec.msgpack.Decoder()
+        # pass check_same_thread=False to use the dict from worker threads, callers
+        # must then serialize access themselves (see CachedPersistDict).
+        self.conn = sqlite3.connect(path, check_same_thread=check_same_thread)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
         self.conn.execute(
             f"CREATE TABLE IF NOT EXISTS {self.table_name} (key TEXT PRIMARY KEY, value BLOB);"
         )
+        # kept as attributes so that sqlite's statement cache sees the same strings.
+        self._set_sql = (
+            f"INSERT OR REPLACE INTO {self.table_name} (key, value) VALUES (?,?) ; "
+        )
+        self._items_first_sql = (
+            f"SELECT key, value FROM {self.table_name} ORDER BY key LIMIT ?;"
+        )
+        self._items_sql = (
+            f"SELECT key, value FROM {self.table_name} WHERE key > ? "
+            f"ORDER BY key LIMIT ?;"
+        )
+        self._contains_sql = f"SELECT 1 FROM {self.table_name} WHERE key=?;"
+        self._get_sql = f"SELECT value FROM {self.table_name} WHERE key=?;"
+
+    def _encode(self, value: T):
+        if self.serializer == "msgpack":
+            return self._encoder.encode(todict_rec(value))
+        return json.dumps(value, cls=MyJsonEncoder)
+
+    def _decode(self, v) -> T:
+        # json rows come back from sqlite as TEXT, msgpack rows as BLOB.
+        if isinstance(v, str):
+            return self._json_decoder.decode(v)
+        if msgspec is None:
+            raise ImportError("reading msgpack rows requires the msgspec package")
+        return ofdict(self.T, self._decoder.decode(v))
 
     def get(self, key: str) -> T:
-        cur = self.conn.execute(
-            f"SELECT value FROM {self.table_name} WHERE key=?; ", (key,)
-        )
-        item = cur.fetchone()
+        item = self.conn.execute(self._get_sql, (key,)).fetchone()
         if item is None:
             raise KeyError(key)
-        r = json.loads(item[0], cls=TypedJsonDecoder, T=self.T)
-        return r
+        return self._decode(item[0])
+
+    def __contains__(self, key: str) -> bool:
+        cur = self.conn.execute(self._contains_sql, (key,))
+        return cur.fetchone() is not None
+
+    def values_batch(self, keys: list[str], batch_size: int = 500) -> list[T]:
+        """Get the values for `keys` with one query per `batch_size` keys.
+
+        Raises a KeyError if any of the keys are missing.
+        """
+        found: dict[str, T] = {}
+        for i in range(0, len(keys), batch_size):
+            chunk = keys[i : i + batch_size]
+            qs = ",".join("?" * len(chunk))
+            cur = self.conn.execute(
+                f"SELECT key, value FROM {self.table_name} WHERE key IN ({qs});",
+                chunk,
+            )
+            for k, v in cur:
+                found[k] = self._decode(v)
+        return [found[k] for k in keys]
 
     def pop(self, key) -> T:
         with self.conn:  # make a transaction
@@ -37,19 +127,176 @@ class PersistDict(Generic[T]):
             self.conn.execute(f"DELETE FROM {self.table_name} WHERE key=? ; ", (key,))
             return r
 
+    def delete(self, key: str):
+        """Remove the key if present, without reading its value."""
+        with self.conn:
+            self.conn.execute(f"DELETE FROM {self.table_name} WHERE key=? ; ", (key,))
+
     def set(self, key: str, value: T):
-        v = json.dumps(value, cls=MyJsonEncoder)
-        self.conn.execute(
-            f"INSERT OR REPLACE INTO {self.table_name} (key, value) VALUES (?,?) ; ",
-            (key, v),
-        )
+        """Set a value.
+
+        Writes are committed every `commit_interval` sets or `commit_delay` seconds
+        after the first uncommitted one, whichever comes first. Without a running
+        event loop every set is committed straight away.
+        """
+        v = self._encode(value)
+        self.conn.execute(self._set_sql, (key, v))
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_interval:
+            self.flush()
+        else:
+            self._schedule_commit()
+
+    def flush(self):
+        """Commit any pending writes."""
+        self._cancel_commit()
+        self._uncommitted = 0
+        if self.conn.in_transaction:
+            self.conn.commit()
+
+    def _cancel_commit(self):
+        if self._commit_handle is not None:
+            self._commit_handle.cancel()
+            self._commit_handle = None
+
+    def _schedule_commit(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        # a handle from another (possibly closed) loop would never fire.
+        if self._commit_handle is not None and self._commit_loop is loop:
+            return
+        self._cancel_commit()
+        self._commit_loop = loop
+        self._commit_handle = loop.call_later(self.commit_delay, self._on_commit_timer)
+
+    def _on_commit_timer(self):
+        self._commit_handle = None
+        self.flush()
+
+    def set_many(self, items: Iterable[tuple[str, T]]):
+        """Set many values in a single transaction."""
+        with self.conn:
+            self.conn.executemany(
+                self._set_sql, ((k, self._encode(v)) for k, v in items)
+            )
+        self._cancel_commit()
+        self._uncommitted = 0
 
     def clear(self):
         self.conn.execute(f"DELETE FROM {self.table_name};")
 
-    def items(self) -> Iterable[tuple[str, T]]:
-        with self.conn:  # make a transaction
-            cur = self.conn.execute(f"SELECT key, value FROM {self.table_name};")
-            items = list(cur.fetchall())
-        for key, v in items:
-            yield key, json.loads(v, cls=TypedJsonDecoder, T=self.T)
+    def items(self, batch_size: int = 1000) -> Iterable[tuple[str, T]]:
+        """Iterate over the rows in key order, fetching `batch_size` rows at a time.
+
+        Each batch is its own query, and no cursor or transaction is held open while
+        yielding, so callers may write to the dict during iteration.
+        """
+        last = None
+        while True:
+            if last is None:
+                cur = self.conn.execute(self._items_first_sql, (batch_size,))
+            else:
+                cur = self.conn.execute(self._items_sql, (last, batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            for key, v in rows:
+                yield key, self._decode(v)
+
+
+class CachedPersistDict(Generic[T]):
+    """Keeps recently set values in memory in front of a `PersistDict`.
+
+    `set` only touches memory. Writes are collected and flushed to sqlite in one
+    transaction a little later on the running event loop, or straight away when
+    there is no loop. Call `flush` before shutting down.
+
+    `pop_async` reads misses on a worker thread, for that the store must be opened
+    with `check_same_thread=False`. All store access goes through one lock.
+    """
+
+    def __init__(
+        self, store: PersistDict[T], max_size: int = 1024, flush_delay: float = 0.5
+    ):
+        self.store = store
+        self.max_size = max_size
+        self.flush_delay = flush_delay
+        self._mem: OrderedDict[str, T] = OrderedDict()
+        self._dirty: dict[str, T] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def set(self, key: str, value: T):
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        self._dirty[key] = value
+        if len(self._mem) > self.max_size:
+            # evicted values must be on disk first.
+            self.flush()
+            self._mem.popitem(last=False)
+        self._schedule_flush()
+
+    def get(self, key: str) -> T:
+        if key in self._mem:
+            return self._mem[key]
+        with self._lock:
+            return self.store.get(key)
+
+    def pop(self, key: str) -> T:
+        if key not in self._mem:
+            return self._store_pop(key)
+        value = self._mem.pop(key)
+        if key in self._dirty:
+            del self._dirty[key]
+        else:
+            # already flushed.
+            with self._lock:
+                self.store.delete(key)
+        return value
+
+    async def pop_async(self, key: str) -> T:
+        """Like `pop`, but a miss is read from sqlite without blocking the loop."""
+        if key in self._mem:
+            return self.pop(key)
+        return await asyncio.to_thread(self._store_pop, key)
+
+    def _store_pop(self, key: str) -> T:
+        with self._lock:
+            return self.store.pop(key)
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._dirty:
+            items = list(self._dirty.items())
+            with self._lock:
+                self.store.set_many(items)
+            # only forget the writes once they are on disk, so a failed write is
+            # retried on the next flush.
+            self._dirty.clear()
+
+    def _schedule_flush(self):
+        if not self._dirty:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        # a handle from another (possibly closed) loop would never fire.
+        if self._flush_handle is not None and self._flush_loop is loop:
+            return
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush_loop = loop
+        self._flush_handle = loop.call_later(self.flush_delay, self._on_flush_timer)
+
+    def _on_flush_timer(self):
+        self._flush_handle = None
+        self.flush()
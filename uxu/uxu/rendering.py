@@ -1,23 +1,39 @@
 from abc import ABC, abstractmethod
-from dataclasses import asdict, dataclass, field, is_dataclass, replace
-from typing import Any, Callable, ClassVar, Union
+from dataclasses import MISSING, asdict, dataclass, field, fields, is_dataclass, replace
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Iterator,
+    Optional,
+    Sequence,
+    Union,
+    get_origin,
+)
 from textwrap import indent
 from html import escape
 
-from miniscutil.ofdict import OfDictUnion, ofdict, todict_dataclass, ofdict_dataclass
+from dominate.dom_tag import dom_tag
+import dominate.tags as tags
+
+from miniscutil.ofdict import (
+    OfDictError,
+    OfDictUnion,
+    ofdict,
+    todict,
+)
+from miniscutil.type_util import is_optional
+
+from .util import DATACLASS_SLOTS
 
 """ A rendering is the thing that we actually send over the wire to Javascript. """
 
 
-@dataclass
+@dataclass(frozen=True, **DATACLASS_SLOTS)
 class EventHandler:
     handler_id: Any
 
-    def __eq__(self, other):
-        if not isinstance(other, EventHandler):
-            return False
-        return self.handler_id == other.handler_id
-
     def __todict__(self):
         return {"__handler__": self.handler_id}
 
@@ -31,6 +47,7 @@ RenderedAttrVal = Union[EventHandler, str, dict]
 
 # [todo] abstract class
 class Rendering(ABC):
+    __slots__ = ()
     kind_map: ClassVar[dict[str, type["Rendering"]]] = {}
     id: str
     kind: ClassVar[str]
@@ -40,71 +57,247 @@ class Rendering(ABC):
     def static(self):
         raise NotImplementedError()
 
-    def map_children(self, f):
-        if hasattr(self, "children"):
-            return self.with_children(list(map(f, getattr(self, "children"))))
-        return self
+    def static_html(self, out: list[str]) -> None:
+        """Append the static html for this rendering to `out`.
 
-    def with_children(self, children):
-        assert hasattr(self, "children")
-        assert is_dataclass(self)
-        return replace(self, children=children)
+        Same markup as `static()` but written straight to strings, without building
+        a dominate tree first.
+        """
+        for c in self.get_children():
+            c.static_html(out)
 
-    def get_children(self):
-        return getattr(self, "children", [])
+    def to_static_html(self) -> str:
+        out: list[str] = []
+        self.static_html(out)
+        return "".join(out)
 
-    def get_ids(self, acc=[]):
-        acc.append(self.id)
-        for c in self.get_children():
-            c.get_ids(acc)
-        assert len(set(acc)) == len(acc), "non-unique id"
+    def map_children(self, f: Callable[["Rendering"], "Rendering"]) -> "Rendering":
+        cs = self.get_children()
+        if not cs:
+            return self
+        return self.with_children(list(map(f, cs)))
+
+    def _shallow_copy(self):
+        # cheaper than dataclasses.replace or copy.copy (fields() or __reduce_ex__).
+        return _per_class(type(self), "_copy", _make_copy)(self)
+
+    def with_children(self, children):
+        assert hasattr(self, "children")
+        new = self._shallow_copy()
+        new.children = children
+        return new
+
+    def with_attrs(self, attrs):
+        assert hasattr(self, "attrs")
+        new = self._shallow_copy()
+        new.attrs = attrs
+        return new
+
+    def get_children(self) -> Sequence["Rendering"]:
+        """Overridden by the renderings that have children."""
+        return ()
+
+    def get_ids(self, acc: Optional[list] = None) -> list:
+        """The ids of this rendering and its descendants in depth-first order, appended
+        to `acc` if given."""
+        if acc is None:
+            acc = []
+        start = len(acc)
+        stack = [self]
+        while stack:
+            r = stack.pop()
+            acc.append(r.id)
+            stack.extend(reversed(r.get_children()))
+        if __debug__:
+            ids = acc[start:]
+            assert len(set(ids)) == len(ids), "non-unique id"
         return acc
 
-    def lens_id(self, id, f):
+    def lens_id(self, id: Any, f: Callable[["Rendering"], "Rendering"]) -> "Rendering":
         if self.id == id:
             return f(self)
-        cs = getattr(self, "children", None)
-        if cs is None:
+        # depth-first search with an explicit stack, each entry remembers its parent
+        # entry and its index in the parent's children so the path can be rebuilt.
+        entries: list[tuple[Rendering, int, int]] = [(self, -1, -1)]
+        stack = [0]
+        while stack:
+            e = stack.pop()
+            node = entries[e][0]
+            if node.id == id:
+                break
+            cs = node.get_children()
+            if cs:
+                for i in range(len(cs) - 1, -1, -1):
+                    stack.append(len(entries))
+                    entries.append((cs[i], e, i))
+        else:
             raise LookupError()
-        for i, c in enumerate(cs):
-            try:
-                r = c.lens_id(id, f)
-            except LookupError:
-                continue
-            if not isinstance(r, Rendering):
-                raise TypeError("function must return rendering")
-            cs = cs.copy()
+        r = f(node)
+        if not isinstance(r, Rendering):
+            raise TypeError("function must return rendering")
+        _, parent, i = entries[e]
+        while parent != -1:
+            p = entries[parent][0]
+            cs = p.get_children()
+            if r is cs[i]:
+                # unchanged, keep sharing this subtree.
+                return self
+            # one copy plus a store beats slice concatenation, for lists and tuples.
+            cs = list(cs)
             cs[i] = r
-            return replace(self, children=cs)  # type: ignore
-        raise LookupError()
+            r = p.with_children(cs)
+            _, parent, i = entries[parent]
+        return r
 
     def __init_subclass__(cls, **kwargs):
         kind = cls.kind
         assert isinstance(kind, str)
+        old = cls.kind_map.get(kind)
+        # dataclass(slots=True) recreates the class, registering the kind twice.
+        if old is not None and (old.__module__, old.__qualname__) != (
+            cls.__module__,
+            cls.__qualname__,
+        ):
+            raise TypeError(
+                f"{cls.__module__}.{cls.__qualname__} and "
+                f"{old.__module__}.{old.__qualname__} both use kind {kind!r}"
+            )
         cls.kind_map[kind] = cls
         super().__init_subclass__(**kwargs)
 
     @classmethod
     def __ofdict__(cls, d):
-        assert isinstance(d, dict)
-        if "kind" not in d:
-            raise ValueError("missing kind key of dict")
-        k = d.pop("kind")
-        assert k in cls.kind_map, f"unrecognised kind {k} for {cls.__name__}"
-        T = cls.kind_map[k]
-        return ofdict_dataclass(T, d)
+        if not isinstance(d, dict):
+            # an OfDictError lets ofdict try the other members of an Optional/Union.
+            raise OfDictError(f"expected a dict for {cls.__name__} but got {type(d)}")
+        k = d.get("kind")
+        of_dict = _kind_decoders.get(k)
+        if of_dict is None:
+            if k is None:
+                raise ValueError("missing kind key of dict")
+            assert k in cls.kind_map, f"unrecognised kind {k} for {cls.__name__}"
+            of_dict = _per_class(cls.kind_map[k], "_of_dict", _make_of_dict)
+            _kind_decoders[k] = of_dict
+        return of_dict(d)
 
     def __todict__(self):
-        assert is_dataclass(self)
-        d = todict_dataclass(self)
-        kind = getattr(type(self), "kind")
-        assert isinstance(kind, str)
-        assert kind in Rendering.kind_map
-        d["kind"] = kind
-        return d
-
-
-@dataclass
+        return _per_class(type(self), "_to_dict", _make_to_dict)(self)
+
+
+_kind_decoders: dict[str, Callable[[dict], "Rendering"]] = {}
+""" Decoder for each wire kind, so decoding a node is one dict lookup on the kind. """
+
+
+def _per_class(cls: type, name: str, make: Callable[[type], Callable]) -> Callable:
+    """Get a function generated for exactly `cls`, making it on first use.
+
+    Built lazily because the dataclass fields don't exist yet in __init_subclass__.
+    """
+    f = cls.__dict__.get(name)
+    if f is None:
+        f = make(cls)
+        setattr(cls, name, f)
+    return f
+
+
+def _ofdict_attr(v: Any) -> RenderedAttrVal:
+    if isinstance(v, dict) and "__handler__" in v:
+        return EventHandler.__ofdict__(v)
+    return v
+
+
+def _ofdict_children(xs: Any) -> list["Rendering"]:
+    if not isinstance(xs, list):
+        raise OfDictError(f"expected a list of renderings but got {type(xs)}")
+    return [Rendering.__ofdict__(x) for x in xs]
+
+
+def _field_decoder(T: Any) -> Optional[Callable[[Any], Any]]:
+    """A decoder for a Rendering field of type T, None if the value is used as-is."""
+    if T is Any:
+        return None
+    if T == list[Rendering]:
+        return _ofdict_children
+    if T == dict[str, RenderedAttrVal]:
+        # generic ofdict tries EventHandler first for every member of the union.
+        return lambda d: {k: _ofdict_attr(v) for k, v in d.items()}
+    return partial(ofdict, T)
+
+
+def _make_of_dict(cls: type) -> Callable[[dict], Any]:
+    """Build the decoder for one Rendering dataclass.
+
+    Field types are resolved to decoders once here instead of on every call as
+    `ofdict_dataclass` does.
+    """
+    assert is_dataclass(cls)
+    specs = []
+    for f in fields(cls):
+        if not f.init:
+            # derived in __post_init__.
+            continue
+        required = f.default is MISSING and f.default_factory is MISSING
+        specs.append((f.name, _field_decoder(f.type), required))
+
+    def of_dict(d: dict):
+        kwargs = {}
+        for name, decode, required in specs:
+            if name in d:
+                v = d[name]
+                kwargs[name] = v if decode is None else decode(v)
+            elif required:
+                raise OfDictError(f"Missing {name} on input dict for {cls.__name__}.")
+        return cls(**kwargs)
+
+    return of_dict
+
+
+def _make_copy(cls: type) -> Callable[[Any], Any]:
+    """Generate a shallow copy function that works with and without slots."""
+    assert is_dataclass(cls)
+    lines = ["def _copy(self):", "    new = _new(cls)"]
+    lines.extend(f"    new.{f.name} = self.{f.name}" for f in fields(cls))
+    lines.append("    return new")
+    ns: dict = {}
+    exec("\n".join(lines), {"_new": object.__new__, "cls": cls}, ns)
+    return ns["_copy"]
+
+
+def _make_to_dict(cls: type) -> Callable[[Any], dict]:
+    """Generate a `__todict__` body for the given Rendering dataclass.
+
+    Gives the same result as `todict_dataclass` plus the `kind` key, but with the
+    field list unrolled so that nothing is looked up per call.
+    Fields declared as str, list or dict are passed through as-is (`todict` returns
+    them unchanged), everything else goes through `todict`.
+    """
+    assert is_dataclass(cls)
+    kind = getattr(cls, "kind")
+    assert isinstance(kind, str)
+    assert kind in Rendering.kind_map
+    items = []
+    optional = []
+    for f in fields(cls):
+        if not f.init:
+            # derived fields aren't part of the wire format.
+            continue
+        if f.type is str or get_origin(f.type) in (list, dict):
+            items.append(f"{f.name!r}: self.{f.name}")
+        else:
+            items.append(f"{f.name!r}: todict(self.{f.name})")
+        if is_optional(f.type):
+            optional.append(f.name)
+    items.append(f"'kind': {kind!r}")
+    lines = [f"def _to_dict(self):", f"    d = {{{', '.join(items)}}}"]
+    for name in optional:
+        lines.append(f"    if d[{name!r}] is None: del d[{name!r}]")
+    lines.append("    return d")
+    ns: dict = {}
+    exec("\n".join(lines), {"todict": todict}, ns)
+    return ns["_to_dict"]
+
+
+@dataclass(**DATACLASS_SLOTS)
 class RootRendering(Rendering):
     """Rendering at the root of the uxu mount point."""
 
@@ -113,25 +306,66 @@ class RootRendering(Rendering):
     key: Any = field(default=None)
     kind: ClassVar[str] = "root"
 
+    def get_children(self) -> list[Rendering]:
+        return self.children
+
     def static(self):
         return [x.static() for x in self.children]
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class RenderedText(Rendering):
     value: str
     id: Any
+    key: int = field(init=False, repr=False, compare=False)
     kind: ClassVar[str] = "text"
 
+    def __post_init__(self):
+        # computed once, keys are read many times while diffing.
+        self.key = hash(("text", self.value))
+
     def static(self):
         return self.value
 
-    @property
-    def key(self):
-        return hash(("text", self.value))
+    def static_html(self, out: list[str]) -> None:
+        out.append(escape(self.value, quote=False))
+
+
+_TAG_CACHE: dict[str, type] = {}
+_ATTR_NAME_CACHE: dict[str, str] = {}
+
+VOID_TAGS = frozenset(
+    ["area", "base", "br", "col", "embed", "hr", "img", "input"]
+    + ["link", "meta", "param", "source", "track", "wbr"]
+)
 
 
-@dataclass
+def _get_tag(name: str) -> type:
+    t = _TAG_CACHE.get(name)
+    if t is None:
+        t = _TAG_CACHE[name] = getattr(tags, name)
+    return t
+
+
+def _attr_name(k: str) -> str:
+    # same renaming as dominate, eg cls -> class.
+    n = _ATTR_NAME_CACHE.get(k)
+    if n is None:
+        n = _ATTR_NAME_CACHE[k] = dom_tag.clean_attribute(k)
+    return n
+
+
+def _static_render_attr(k: str, v: RenderedAttrVal) -> str:
+    if isinstance(v, str):
+        return v
+    elif isinstance(v, dict):
+        assert k == "style"
+        return "; ".join(f"{k}: {s}" for k, s in v.items())
+    else:
+        raise TypeError()
+
+
+@dataclass(**DATACLASS_SLOTS)
 class RenderedElement(Rendering):
     id: Any
     tag: str
@@ -140,45 +374,52 @@ class RenderedElement(Rendering):
     key: Any = field(default=None)
     kind: ClassVar[str] = "element"
 
-    def static(self):
-        from dominate.dom_tag import dom_tag
-        import dominate.tags as tags
-
-        def static_render_attr(k, v):
-            if isinstance(v, str):
-                return v
-            elif isinstance(v, dict):
-                assert k == "style"
-                xs = "; ".join(f"{k}: {s}" for k, s in v.items())
-                return f'{k}="{xs}"'
-            else:
-                raise TypeError()
+    def get_children(self) -> list[Rendering]:
+        return self.children
 
-        attrs = {
-            k: static_render_attr(k, v)
-            for k, v in self.attrs.items()
-            if not isinstance(v, EventHandler)
-        }
-        attrs = {**self.attrs, "data-uxu-id": self.id}
-        cls = getattr(tags, self.tag)
+    def static(self):
+        attrs = {}
+        for k, v in self.attrs.items():
+            if isinstance(v, EventHandler):
+                continue
+            attrs[k] = _static_render_attr(k, v)
+        attrs["data-uxu-id"] = self.id
+        cls = _get_tag(self.tag)
         children = [c.static() for c in self.children]
         elt = cls(*children, **attrs)
         assert isinstance(elt, dom_tag)
         return elt
 
+    def static_html(self, out: list[str]) -> None:
+        tag = self.tag
+        out.append("<" + tag)
+        for k, v in self.attrs.items():
+            if isinstance(v, EventHandler):
+                continue
+            out.append(f' {_attr_name(k)}="{escape(_static_render_attr(k, v))}"')
+        out.append(f' data-uxu-id="{escape(str(self.id))}">')
+        if tag in VOID_TAGS and not self.children:
+            return
+        for c in self.children:
+            c.static_html(out)
+        out.append(f"</{tag}>")
+
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class RenderedFragment(Rendering):
     id: Any
     children: list[Rendering]
     key: Any = field(default=None)
     kind: ClassVar[str] = "fragment"
 
+    def get_children(self) -> list[Rendering]:
+        return self.children
+
     def static(self):
         return [c.static() for c in self.children]
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class RenderedWidget:
     """This is used to hook into JavaScript code."""
 
@@ -190,31 +431,65 @@ class RenderedWidget:
 
 
 # [todo] put on Rendering methods
-def iter_event_handlers(x: Rendering):
-    if isinstance(x, RenderedElement):
-        for name, v in x.attrs.items():
-            if isinstance(v, EventHandler):
-                yield name, v
-    children = getattr(x, "children", [])
-    for child in children:
-        yield from iter_event_handlers(child)
+def iter_event_handlers(x: Rendering) -> Iterator[tuple[str, EventHandler]]:
+    stack = [x]
+    while stack:
+        x = stack.pop()
+        if isinstance(x, RenderedElement):
+            for name, v in x.attrs.items():
+                if isinstance(v, EventHandler):
+                    yield name, v
+        children = x.get_children()
+        if children:
+            stack.extend(reversed(children))
 
 
 # [todo] use methods on Rendering instead.
-def map_event_handlers(modify: Callable[[EventHandler], EventHandler]):
-    def rec(x: Rendering) -> Rendering:
+def map_event_handlers(
+    modify: Callable[[EventHandler], EventHandler]
+) -> Callable[[Rendering], Rendering]:
+    """Subtrees where `modify` changes nothing are returned as the same objects, so
+    comparing the result with the input only walks the parts that changed."""
+
+    def rebuild(x: Rendering, children: list[Rendering]) -> Rendering:
+        same_children = all(a is b for a, b in zip(children, x.children))
         if isinstance(x, RenderedElement):
-            attrs = {
-                k: modify(v) if isinstance(v, EventHandler) else v
-                for k, v in x.attrs.items()
-            }
-            children = list(map(rec, x.children))
+            if any(isinstance(v, EventHandler) for v in x.attrs.values()):
+                attrs = {
+                    k: modify(v) if isinstance(v, EventHandler) else v
+                    for k, v in x.attrs.items()
+                }
+                same_attrs = all(attrs[k] is v for k, v in x.attrs.items())
+            else:
+                # most elements have no handlers, don't copy their attrs.
+                attrs, same_attrs = x.attrs, True
+            if same_attrs and same_children:
+                return x
             return replace(x, attrs=attrs, children=children)
-        elif isinstance(x, RenderedText):
+        if same_children:
             return x
-        elif isinstance(x, RenderedFragment):
-            return replace(x, children=list(map(rec, x.children)))
-        else:
-            raise TypeError()
+        return replace(x, children=children)
+
+    def rec(root: Rendering) -> Rendering:
+        # post-order walk with an explicit stack, rebuilt nodes collect on `out`.
+        stack: list[tuple[Rendering, bool]] = [(root, False)]
+        out: list[Rendering] = []
+        while stack:
+            x, children_done = stack.pop()
+            if isinstance(x, RenderedText):
+                out.append(x)
+            elif not isinstance(x, (RenderedElement, RenderedFragment)):
+                raise TypeError()
+            elif not x.children:
+                out.append(rebuild(x, []))
+            elif not children_done:
+                stack.append((x, True))
+                stack.extend((c, False) for c in reversed(x.children))
+            else:
+                n = len(x.children)
+                children = out[len(out) - n :]
+                del out[len(out) - n :]
+                out.append(rebuild(x, children))
+        return out[0]
 
     return rec
@@ -1,15 +1,16 @@
 import asyncio
+from contextlib import asynccontextmanager
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
-from secrets import token_urlsafe
-from typing import Any, Callable, Optional, Protocol
-from uuid import UUID, uuid4
+from secrets import token_hex, token_urlsafe
+from typing import Callable, Optional, Protocol
+from uuid import UUID
+import html
 import logging
 
 from pydantic import BaseModel, BaseSettings, Field, SecretStr
-import dominate
-import dominate.tags as t
 from jose import ExpiredSignatureError, JWTError, jwt
 import tempfile
 from starlette.responses import HTMLResponse
@@ -28,11 +29,12 @@ from miniscutil.rpc import (
 
 from uxu.fiber import useState
 from uxu.manager import EventArgs, Manager, render_static
-from uxu.persistence import PersistDict
+from uxu.persistence import CachedPersistDict, PersistDict
 from uxu.__about__ import __version__
 from uxu.html import h
 from uxu.rendering import RootRendering
 from uxu.session import UxuSession
+from uxu.util import DATACLASS_SLOTS
 from uxu.vdom import Html
 
 # https://fastapi.tiangolo.com/advanced/websockets/?h=websocket
@@ -64,19 +66,40 @@ def HelloWorld(text: str):
     )
 
 
+@lru_cache(maxsize=512)
 def component_of_name(name: str):
+    """Resolve a route or component name to a component.
+
+    Cached, call `component_of_name.cache_clear()` if the routes change.
+    """
     return HelloWorld
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class UxuSessionParams:
     id: str  # session id
     component_name: str
     path: str
-    rendering: RootRendering
+    # None when the session was created with lazy rendering.
+    rendering: Optional[RootRendering] = None
     params: dict[str, str] = field(default_factory=dict)
 
 
+PAGE_TEMPLATE = f"""<!DOCTYPE html>
+<html>
+  <head>
+    <title>Uxu {__version__}</title>
+    <link href="https://unpkg.com/tachyons@4.12.0/css/tachyons.min.css" rel="stylesheet">
+  </head>
+  <body>
+    <main id="uxu_root">welcome to uxu...</main>
+    <script type="text/javascript">UXU_TICKET = '{{ticket}}'; UXU_URL = '{{socket_url}}';</script>
+    <script src="{{static_url}}" type="text/javascript"></script>
+  </body>
+</html>"""
+""" The page served by `UxuApplication.handle`, filled in with `str.format`. """
+
+
 # https://stackoverflow.com/questions/66093397/how-to-disable-starlette-static-files-caching
 class MyStatics(StaticFiles):
     def is_not_modified(self, response_headers, request_headers) -> bool:
@@ -95,9 +118,20 @@ class UxuApplication:
     """
 
     def __init__(self):
-        self.cfg = Settings()  # type: ignore
-        self.persistence = PersistDict(
-            self.cfg.persistent_dict_path, T=UxuSessionParams
+        self.cfg = get_settings()
+        # resolved once rather than per request / connection.
+        self.jwt_key = self.cfg.jwt_secret.get_secret_value()
+        self.jwt_algorithms = [self.cfg.jwt_algorithm]
+        # tickets are usually claimed within seconds, so serve them from memory and
+        # keep the sqlite write off the request path. This assumes a single worker
+        # process: a ticket is only visible to other processes once flushed, so a
+        # websocket landing on another worker within `flush_delay` would miss it.
+        self.persistence = CachedPersistDict(
+            PersistDict(
+                self.cfg.persistent_dict_path,
+                T=UxuSessionParams,
+                check_same_thread=False,
+            )
         )
         self.webapp = Starlette(
             debug=True,
@@ -111,8 +145,16 @@ class UxuApplication:
                 WebSocketRoute("/ws", endpoint=self.handle_websocket),
                 Route("/{name:str}", self.handle),
             ],
+            lifespan=self.lifespan,
         )
 
+    @asynccontextmanager
+    async def lifespan(self, app):
+        try:
+            yield
+        finally:
+            self.persistence.flush()
+
     async def __call__(self, scope, receive, send):
         return await self.webapp(scope, receive, send)
 
@@ -124,7 +166,7 @@ class UxuApplication:
         # [todo] get subject as id of authenticated user.
         socket_url = request.url_for("handle_websocket")
         static_url = request.url_for("static", path="uxu.js")
-        session_id = uuid4().hex
+        session_id = token_hex(16)
         claims = TicketClaims(
             exp=expire,
             iat=datetime.utcnow(),
@@ -137,14 +179,16 @@ class UxuApplication:
         )
         ticket = jwt.encode(
             claims=claims.dict(exclude_none=True),
-            key=cfg.jwt_secret.get_secret_value(),
+            key=self.jwt_key,
             algorithm=cfg.jwt_algorithm,
         )
 
         # [todo] implement uxu routing table.
         component = component_of_name(request.url.path)
-        initial_html = component(request.url.path)
-        rendering = render_static(initial_html)
+        # the client asks for a full `render` once initialized, so the static
+        # rendering is only needed to hydrate and can be skipped.
+        lazy = cfg.lazy_render or request.headers.get("x-uxu-lazy-render") == "1"
+        rendering = None if lazy else render_static(component(request.url.path))
 
         session_params = UxuSessionParams(
             id=session_id,
@@ -153,32 +197,25 @@ class UxuApplication:
             params={},  # [todo]
             rendering=rendering,
         )
-        self.persistence.set(session_id, session_params)  # [todo] make async
-        # [todo] remove dep on dominate
-        document: Any = dominate.document(title=f"Uxu {__version__}")
-        with document.head:
-            t.link(
-                rel="stylesheet",
-                href="https://unpkg.com/tachyons@4.12.0/css/tachyons.min.css",
-            )
-        with document.body:
-            t.main("welcome to uxu...", id="uxu_root")
-            # [todo] is this the best way to inject a secret?
-            # try switching to using a cookie that the JS can't see.
-            t.script(
-                f"UXU_TICKET = '{ticket}'; UXU_URL = '{socket_url}';",
-                type="text/javascript",
-            )
-            t.script(type="text/javascript", src=static_url)
-
-        content = document.render()
+        self.persistence.set(session_id, session_params)
+        # [todo] is this the best way to inject a secret?
+        # try switching to using a cookie that the JS can't see.
+        content = PAGE_TEMPLATE.format(
+            ticket=html.escape(ticket, quote=False),
+            socket_url=html.escape(str(socket_url), quote=False),
+            static_url=html.escape(str(static_url)),
+        )
         return HTMLResponse(content=content)
 
     async def handle_websocket(self, websocket: WebSocket):
         await websocket.accept()
         transport = StarletteWebsocketTransport(websocket)
         with UxuWebSession(
-            transport, self.persistence, socket_url=str(websocket.url)
+            transport,
+            self.persistence,
+            socket_url=str(websocket.url),
+            jwt_key=self.jwt_key,
+            jwt_algorithms=self.jwt_algorithms,
         ) as server:
             await server.serve_forever()
         await websocket.close()
@@ -193,6 +230,29 @@ class TicketClaims(BaseModel):
     sub: Optional[UUID]
 
 
+_TICKET_DECODE_OPTIONS = {
+    "require_exp": True,
+    "require_iat": True,
+    "require_aud": True,
+    "require_iss": True,
+    "require_jti": True,
+}
+
+
+def decode_ticket(
+    ticket: str, key: str, algorithms: list[str], audience: str
+) -> TicketClaims:
+    """Verify a ticket and return its claims."""
+    d = jwt.decode(
+        ticket,
+        key=key,
+        algorithms=algorithms,
+        audience=audience,
+        options=_TICKET_DECODE_OPTIONS,
+    )
+    return TicketClaims.parse_obj(d)
+
+
 class Settings(BaseSettings):
     jwt_expires: timedelta = Field(default=timedelta(hours=2))
     jwt_algorithm: str = Field(default="HS256")
@@ -203,12 +263,19 @@ class Settings(BaseSettings):
     persistent_dict_path: Path = Field(
         default_factory=lambda: Path(tempfile.gettempdir()) / "uxu_server.sqlite"
     )
+    lazy_render: bool = Field(default=False)
 
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
 
 
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """The settings, read from the environment and `.env` once per process."""
+    return Settings()  # type: ignore
+
+
 class PeerInfo(BaseModel):
     name: str
     version: str
@@ -231,28 +298,31 @@ class UxuWebSession(UxuSession):
     def __init__(
         self,
         transport: Transport,
-        persistence: PersistDict[UxuSessionParams],
+        persistence: CachedPersistDict[UxuSessionParams],
         socket_url: str,
+        jwt_key: str,
+        jwt_algorithms: list[str],
     ):
         super().__init__(transport=transport, spec=None)
         self.persistence = persistence
         self.socket_url = socket_url
+        # from the application's settings, loading Settings here would re-read .env.
+        self.jwt_key = jwt_key
+        self.jwt_algorithms = jwt_algorithms
 
     @rpc_method("initialize")
     async def on_initialize(self, params: UxuInitParams):
-        cfg = Settings()  # type: ignore
         if not isinstance(params, UxuInitParams):
             raise invalid_params()
-        claims = jwt.decode(
+        claims = decode_ticket(
             params.ticket,
-            key=cfg.jwt_secret.get_secret_value(),
-            algorithms=[cfg.jwt_algorithm],
+            key=self.jwt_key,
+            algorithms=self.jwt_algorithms,
             audience=self.socket_url,
         )
-        claims = TicketClaims.parse_obj(claims)
-        session_params: UxuSessionParams = self.persistence.pop(
+        session_params: UxuSessionParams = await self.persistence.pop_async(
             claims.jti
-        )  # [todo] make async
+        )
         component = component_of_name(session_params.component_name)
         spec = component(session_params.path)
 
@@ -261,8 +331,11 @@ class UxuWebSession(UxuSession):
         # [todo] url should be validated. ticket should be per-route
         # [todo] we should route to different things.
 
-        self.manager.hydrate(session_params.rendering, spec)
-        self.patch_task = asyncio.create_task(self.patcher_loop())
+        if session_params.rendering is None:
+            self.manager.initialize(spec)
+        else:
+            self.manager.hydrate(session_params.rendering, spec)
+        self.start_patcher()
 
         return UxuInitResponse(
             serverInfo=PeerInfo(name="uxu-server", version=__version__)
@@ -27,12 +27,21 @@ class UxuSession(RpcServer):
     def __init__(self, transport: Transport, spec: Optional[Html] = None):
         super().__init__(transport, init_mode=InitializationMode.ExpectInit)
         self.manager = Manager(spec=spec, is_static=False)
+        self.patch_task: Optional[asyncio.Task] = None
 
     @rpc_method("initialized")
     async def on_initialized(self, params: Any):
-        self.patch_task = asyncio.create_task(self.patcher_loop())
+        self.start_patcher()
         logger.debug(f"{self.name} initialized")
 
+    def start_patcher(self):
+        """Start the patcher loop, unless it is already running."""
+        if self.patch_task is not None and not self.patch_task.done():
+            return
+        self.patch_task = asyncio.create_task(
+            self.patcher_loop(), name=f"{self.name} patcher_loop"
+        )
+
     @rpc_method("render")
     def on_render(self, params):
         return self.manager.render()
@@ -45,10 +54,8 @@ class UxuSession(RpcServer):
         while True:
             try:
                 patches = await self.manager.wait_patches()
-                if len(patches) > 0:
-                    result = await self.request("patch", patches)
-                    # [todo] send encoded patches
-                    logger.debug(f"patcher_loop patched: {result}")
+                result = await self.request("patch", patches)
+                logger.debug(f"patcher_loop patched: {result}")
             except asyncio.CancelledError:
                 logger.debug("patcher_loop: cancelled")
                 break
@@ -62,7 +69,7 @@ class UxuSession(RpcServer):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if hasattr(self, "patch_task"):
+        if self.patch_task is not None:
             self.patch_task.cancel()
         self.manager.dispose()
 
@@ -1,14 +1,20 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import ClassVar
 
 from .rendering import RenderedText, Rendering
+from .util import DATACLASS_SLOTS
 from .patch import InvalidatePatch, ReplaceElementPatch
 from .vdom import Id, NormSpec, Vdom, patch, fresh_id, to_html
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class TextNodeSpec(NormSpec):
     value: str
+    # must agree with RenderedText.key, computed once because diffs read it per node.
+    key: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.key = hash(("text", self.value))
 
     def create(self):
         return TextNode(key=self.key, id=fresh_id(), value=self.value)
@@ -23,15 +29,11 @@ class TextNodeSpec(NormSpec):
             )
             return new_element
 
-    @property
-    def key(self):
-        return hash(("text", self.value))
-
     def __str__(self):
         return f"TextNodeSpec({self.value})"
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class TextNode(Vdom):
     spec_type: ClassVar = TextNodeSpec
     key: int
@@ -48,7 +50,7 @@ class TextNode(Vdom):
         return RenderedText(self.value, self.id)
 
     def reconcile(self, new_spec: TextNodeSpec) -> "TextNode":
-        if isinstance(new_spec, TextNodeSpec) and new_spec.key == self.key:
+        if isinstance(new_spec, TextNodeSpec) and new_spec.value == self.value:
             return self
         else:
             self.dispose()
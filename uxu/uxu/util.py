@@ -1,4 +1,10 @@
+import sys
+
 try:
     from typing import ParamSpec
 except ImportError:
     from typing_extensions import ParamSpec
+
+# `@dataclass(**DATACLASS_SLOTS)` drops the instance __dict__ where dataclasses can
+# do it for us (python >= 3.10), for classes with one instance per DOM node.
+DATACLASS_SLOTS: dict = {"slots": True} if sys.version_info >= (3, 10) else {}
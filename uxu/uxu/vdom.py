@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
-from contextlib import contextmanager
 from contextvars import ContextVar
 from functools import singledispatch
+import itertools
 from typing import (
     Any,
     Callable,
@@ -15,7 +15,7 @@ from typing import (
 import uuid
 from .rendering import Rendering
 from .listdiff import Reorder, diff as listdiff
-from .patch import InvalidatePatch, Patch
+from .patch import InvalidatePatch, ModifyChildrenPatch, Patch
 
 
 class VdomContext(Protocol):
@@ -28,6 +28,10 @@ class VdomContext(Protocol):
     def _unregister_event(self, k: str):
         ...
 
+    def _invalidate(self, fiber: Any) -> None:
+        """Schedule `fiber` to be re-rendered on the next pass of the update loop."""
+        ...
+
     @property
     def is_static(self) -> bool:
         ...
@@ -36,20 +40,44 @@ class VdomContext(Protocol):
 vdom_context: ContextVar[VdomContext] = ContextVar("vdom_context")
 
 
-@contextmanager
+class _SetVdomContext:
+    # a plain class instead of @contextmanager, which costs a generator per entry.
+    __slots__ = ("ctx", "token")
+
+    def __init__(self, ctx: VdomContext):
+        self.ctx = ctx
+
+    def __enter__(self) -> VdomContext:
+        self.token = vdom_context.set(self.ctx)
+        return self.ctx
+
+    def __exit__(self, *exc):
+        vdom_context.reset(self.token)
+
+
 def set_vdom_context(r: VdomContext):
-    t = vdom_context.set(r)
-    try:
-        yield r
-    finally:
-        vdom_context.reset(t)
+    """Make `r` the current vdom context within a `with` block.
+
+    This stays a ContextVar rather than a module global: tasks spawned by async
+    event handlers and effects copy the context and call `invalidate` after
+    the block has exited.
+    """
+    return _SetVdomContext(r)
 
 
 def patch(patch: Patch):
     return vdom_context.get()._patch(patch)
 
 
+def patch_children(element_id: "Id", reorder: Reorder[Rendering]):
+    """Emit a `ModifyChildrenPatch`, unless the reorder leaves the children as they are."""
+    if reorder.is_identity:
+        return
+    patch(ModifyChildrenPatch(element_id=element_id, reorder=reorder))
+
+
 class Vdom(ABC):
+    __slots__ = ()
     spec_type: ClassVar[type]
     key: str
 
@@ -71,6 +99,7 @@ class Vdom(ABC):
 
 
 class NormSpec(ABC):
+    __slots__ = ()
     key: int
 
     @abstractmethod
@@ -98,13 +127,18 @@ def create(s: list[NormSpec]) -> list[Vdom]:
 
 def create(s):
     if isinstance(s, list):
-        return list(map(create, s))
+        return create_list(s)
     elif isinstance(s, NormSpec):
         return s.create()
     else:
         raise TypeError(f"unrecognised spec {s}")
 
 
+def create_list(ss: list[NormSpec]) -> list[Vdom]:
+    """`create` for callers that know they have a list."""
+    return [s.create() for s in ss]
+
+
 def hydrate(r: Rendering, s: NormSpec) -> Vdom:
     if isinstance(s, NormSpec) and isinstance(r, Rendering):
         return s.hydrate(r)
@@ -124,17 +158,33 @@ def render(s: list[Vdom]) -> list[Rendering]:
 
 def render(s: Union[Vdom, list[Vdom]]):
     if isinstance(s, list):
-        return list(map(render, s))
+        return render_list(s)
     elif isinstance(s, Vdom):
         return s.render()
     else:
         raise TypeError(f"unrecognised spec {s}")
 
 
+def render_list(vs: list[Vdom]) -> list[Rendering]:
+    return [v.render() for v in vs]
+
+
+def diff_keys(old: list[Any], new: list[NormSpec]) -> Reorder:
+    """Diff two lists by key, skipping the list diff when the keys are unchanged."""
+    # listdiff indexes and measures both sides, so the keys have to be lists.
+    # Comprehensions beat list(map(attrgetter("key"), ...)) here on 3.11, where
+    # the attribute load is specialised for the slotted nodes.
+    k1 = [x.key for x in old]
+    k2 = [x.key for x in new]
+    if k1 == k2:
+        return Reorder.identity(len(k1))
+    return listdiff(k1, k2)
+
+
 def hydrate_lists(
     old: list[Rendering], new: list[NormSpec]
 ) -> tuple[list[Vdom], Reorder[Rendering]]:
-    reorder: Reorder = listdiff([x.key for x in old], [x.key for x in new])
+    reorder: Reorder = diff_keys(old, new)
     for ri in reorder.deletions:
         pass
     new_vdom: list[Any] = [None] * len(new)
@@ -145,7 +195,8 @@ def hydrate_lists(
         assert new_vdom[j] is None
         new_vdom[j] = new[j].create()
     assert all(x is not None for x in new_vdom)
-    reorder = reorder.map_inserts(lambda j, _: new_vdom[j].render())
+    if reorder.then_insert_these:
+        reorder = reorder.map_inserts(lambda j, _: new_vdom[j].render())
     # [todo] abstract with reconcile_lists
     return new_vdom, reorder
 
@@ -153,7 +204,7 @@ def hydrate_lists(
 def reconcile_lists(
     old: list[Vdom], new: list[NormSpec]
 ) -> tuple[list[Vdom], Reorder[Rendering]]:
-    reorder: Reorder = listdiff([x.key for x in old], [x.key for x in new])
+    reorder: Reorder = diff_keys(old, new)
     for ri in reorder.deletions:
         old[ri].dispose()
     new_vdom: list[Any] = [None] * len(new)
@@ -164,7 +215,8 @@ def reconcile_lists(
         assert new_vdom[j] is None
         new_vdom[j] = new[j].create()
     assert all(x is not None for x in new_vdom)
-    reorder = reorder.map_inserts(lambda j, _: new_vdom[j].render())
+    if reorder.then_insert_these:
+        reorder = reorder.map_inserts(lambda j, _: new_vdom[j].render())
     return new_vdom, reorder
 
 
@@ -179,22 +231,25 @@ def reconcile(old: Vdom, new: NormSpec) -> Vdom:
 
 def dispose(v: Union[Vdom, list["Vdom"]]):
     if isinstance(v, list):
-        for vv in v:
-            vv.dispose()
+        dispose_list(v)
     else:
         v.dispose()
 
 
+def dispose_list(vs: list[Vdom]):
+    for v in vs:
+        v.dispose()
+
+
 Id = str
 
 UUID = uuid.uuid4().hex[:4]
-ID_COUNTER = 100
+ID_PREFIX = f"{UUID}-"
+_next_id = itertools.count(101).__next__
 
 
 def fresh_id() -> Id:
-    global ID_COUNTER
-    ID_COUNTER += 1
-    return Id(f"{UUID}-{ID_COUNTER}")
+    return ID_PREFIX + str(_next_id())
 
 
 Html = Optional[Union[str, list["Html"], Literal[False], NormSpec]]
@@ -206,19 +261,27 @@ def to_html(x: Any):
 
 
 def normalise_html(c: Html) -> list[NormSpec]:
-    def norm_list(cs) -> Any:
-        for c in cs:
+    # walks nested lists with an explicit stack of iterators rather than
+    # recursive generators, so deep trees don't pay for a frame per level.
+    out: list[NormSpec] = []
+    stack = [iter((c,))]
+    while stack:
+        for c in stack[-1]:
             if isinstance(c, str):
-                yield to_html(c)
+                out.append(to_html(c))
             elif isinstance(c, (list, tuple)):
-                yield from norm_list(c)
+                stack.append(iter(c))
+                break
             elif c is None or c is False or not c:
                 continue
             elif isinstance(c, NormSpec):
-                yield c
-            elif hasattr(c, "__html__"):
-                yield from normalise_html(c.__html__())
+                out.append(c)
             else:
-                yield to_html(c)
-
-    return list(norm_list([c]))
+                html = getattr(c, "__html__", None)
+                if html is not None:
+                    stack.append(iter((html(),)))
+                    break
+                out.append(to_html(c))
+        else:
+            stack.pop()
+    return out